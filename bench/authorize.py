@@ -0,0 +1,46 @@
+'''Time @authorize on a protected view with and without the verified token cache.
+
+    python bench/authorize.py
+'''
+import os
+
+from stub import best, install
+
+from flask import Flask
+from jose import jwt
+
+from server.auth import jwt as auth_jwt
+from server.auth.jwt import authorize, decode_jwt, encode_jwt
+from server.common.cache import TTLCache
+
+CALLS = 20000
+
+
+def main():
+    install()
+    app = Flask(__name__)
+
+    @authorize
+    def view(jwt_info):
+        return 'ok'
+
+    token = encode_jwt({'id': 1, 'role': 'admin'})
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.test_request_context(headers=headers):
+        tokens = auth_jwt._tokens
+        for label, cache in (('token cache off', TTLCache(maxsize=0)), ('token cache on', tokens)):
+            auth_jwt._tokens = cache
+            view()
+            elapsed = best(lambda: [view() for _ in range(CALLS)])
+            print(f'authorize, {label:16} {elapsed / CALLS * 1e6:6.1f} us/request')
+        auth_jwt._tokens = tokens
+
+    secret = os.environ['JWT_SECRET']
+    raw = best(lambda: [jwt.decode(token, secret, algorithms=['HS256']) for _ in range(CALLS)])
+    built = best(lambda: [decode_jwt(token) for _ in range(CALLS)])
+    print(f'cold decode, key from secret {raw / CALLS * 1e6:6.1f} us')
+    print(f'cold decode, prebuilt key    {built / CALLS * 1e6:6.1f} us')
+
+
+if __name__ == '__main__':
+    main()
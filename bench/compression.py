@@ -0,0 +1,62 @@
+'''Body size and time per request of each negotiated content coding.
+
+Runs through the Flask test client, so the times include the Flask overhead. The generated
+rows repeat a small vocabulary and compress better than real data would.
+
+    python bench/compression.py
+'''
+import random
+import time
+
+from stub import install
+
+from server import create_app
+
+REQUESTS = 50
+ENCODINGS = ('identity', 'gzip', 'br', 'zstd')
+WORDS = ('the', 'last', 'night', 'city', 'river', 'dark', 'love', 'war', 'house', 'star')
+
+
+def movie(i):
+    rnd = random.Random(i)
+    title = ' '.join(rnd.choice(WORDS) for _ in range(3)).title()
+    return (i, title, rnd.randint(0, 9), 'PG-13', 'Drama', 'Drama, Thriller', rnd.randint(1950, 2024),
+            rnd.randint(80, 180), 'English', 'Jane Doe, John Roe', 'Ann Director', f'tt{i:07d}')
+
+
+def customer(i):
+    rnd = random.Random(i)
+    first, last = rnd.choice(WORDS).title(), rnd.choice(WORDS).title()
+    return (i, first, last, f'{first} {last}', f'{first}.{last}{i}@example.com'.lower(),
+            f'{rnd.randint(1, 9999)} Main St', 'Springfield', 'IL', '62701', '555-0100')
+
+
+def responder(query):
+    if 'all_movies' in query:
+        return ('id', 'title', 'stock', 'rating', 'category', 'genres', 'year', 'minutes',
+                'language', 'actors', 'director', 'imdb'), [movie(i) for i in range(1, 1002)]
+    if 'all_customers' in query:
+        return ('id', 'first', 'last', 'full', 'email', 'address', 'city', 'state', 'zip',
+                'phone'), [customer(i) for i in range(1, 101)]
+    return ('id',), []
+
+
+def main():
+    install(responder)
+    client = create_app().test_client()
+    for path, label in (('/api/movies/all?limit=1000', 'cached page, buffered'),
+                        ('/api/customers/all', 'streamed, 100 rows')):
+        print(f'{path} ({label})')
+        for encoding in ENCODINGS:
+            client.get(path, headers={'Accept-Encoding': encoding})
+            start = time.perf_counter()
+            for _ in range(REQUESTS):
+                res = client.get(path, headers={'Accept-Encoding': encoding})
+                size = len(res.get_data())
+            elapsed = (time.perf_counter() - start) / REQUESTS
+            used = res.headers.get('Content-Encoding', 'identity')
+            print(f'  {used:9} {size:7d} bytes  {elapsed * 1e3:5.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
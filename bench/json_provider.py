@@ -0,0 +1,42 @@
+'''Serialize all_rentals-shaped rows with Flask's default provider, the stdlib fallback and orjson.
+
+    python bench/json_provider.py
+'''
+import datetime
+import decimal
+
+from stub import best
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from server.common import json_provider
+from server.common.json_provider import FastJSONProvider
+
+ROWS = 50000
+
+
+def rows():
+    now = datetime.datetime(2024, 1, 31, 18, 30)
+    return [{'id': i, 'customer_name': 'Jane Doe', 'customer_id': i % 500, 'titles': 'Heat, Ronin',
+             'movie_ids': '4,8', 'rented_on': now, 'due_date': now + datetime.timedelta(days=5),
+             'charge': decimal.Decimal('3.99')} for i in range(ROWS)]
+
+
+def main():
+    app = Flask(__name__)
+    data = rows()
+    fast = FastJSONProvider(app)
+    orjson = json_provider.orjson
+    cases = [('Flask default provider', lambda: DefaultJSONProvider(app).dumps(data))]
+    cases.append(('stdlib fallback', lambda: fast.dumps(data)))
+    if orjson is not None:
+        cases.append(('orjson', lambda: fast.dumps(data)))
+    for label, fn in cases:
+        json_provider.orjson = orjson if label == 'orjson' else None
+        print(f'{label:24} {best(fn):.2f}s')
+    json_provider.orjson = orjson
+
+
+if __name__ == '__main__':
+    main()
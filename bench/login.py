@@ -0,0 +1,48 @@
+'''Database round trips and throughput of POST /api/user/auth.
+
+The stub sleeps 1 ms per statement and PBKDF2 runs inline at 1000 iterations, so the
+round trips show next to the hashing cost instead of being hidden by it.
+
+    python bench/login.py
+'''
+import json
+import os
+import time
+
+os.environ.setdefault('HASH_WORKERS', '0')
+os.environ.setdefault('HASH_PBKDF2_ITERATIONS', '1000')
+
+from stub import counters, install  # noqa: E402
+
+from server import create_app  # noqa: E402
+from server.auth.hash import derive, get_salt, hash_params  # noqa: E402
+
+LOGINS = 300
+PASSWORD = 'password123'
+
+
+def main():
+    salt = get_salt()
+    params = hash_params()
+    stored = json.dumps(dict(params, salt=salt, hash=derive(PASSWORD, salt, params)))
+
+    def responder(query):
+        if 'FROM users WHERE email' in query:
+            return ('id', 'first', 'last', 'password', 'role'), [(1, 'Jane', 'Doe', stored, 'admin')]
+        return ('id',), []
+
+    install(responder, latency=0.001)
+    client = create_app().test_client()
+    creds = {'email': 'hello@world.com', 'password': PASSWORD}
+    assert client.post('/api/user/auth', json=creds).status_code == 200
+    counters.reset()
+    start = time.perf_counter()
+    for _ in range(LOGINS):
+        client.post('/api/user/auth', json=creds)
+    elapsed = time.perf_counter() - start
+    print(f'{counters.statements / LOGINS:.1f} round trips/login, {LOGINS / elapsed:.0f} logins/s '
+          f'({elapsed / LOGINS * 1e3:.2f} ms/login)')
+
+
+if __name__ == '__main__':
+    main()
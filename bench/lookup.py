@@ -0,0 +1,27 @@
+'''Compare sql_select and sql_lookup on a hot single-row lookup.
+
+Counts a statement parse for every text protocol execute, and for a prepared cursor only
+the first time a query runs on it. The stub has no latency, so the times are client side.
+
+    python bench/lookup.py
+'''
+from stub import best, counters, install
+
+from server.common.db_connect import sql_lookup, sql_select
+
+CALLS = 20000
+QUERY = 'SELECT * FROM movies WHERE id = %s;'
+
+
+def main():
+    install(lambda query: (('id', 'title'), [(1, 'Movie')]))
+    for fn in (sql_select, sql_lookup):
+        fn(QUERY, (1,))
+        counters.reset()
+        elapsed = best(lambda: [fn(QUERY, (x,)) for x in range(CALLS)])
+        parses = counters.parses / (counters.statements or 1)
+        print(f'{fn.__name__:10} {elapsed / CALLS * 1e6:6.1f} us/call  {parses:.2f} statement parses/call')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+'''Stub MySQL connection for the benchmarks in this directory.
+
+The benchmarks run the real pool, DAO and route code against connections that answer
+from memory, so they measure the client side only. Nothing here is used by the app.
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DB_HOST', 'stub')
+os.environ.setdefault('DB_USER', 'stub')
+os.environ.setdefault('DB_PSWD', 'stub')
+os.environ.setdefault('DB_DATA', 'stub')
+os.environ.setdefault('JWT_SECRET', 'bench')
+
+
+def empty(query):
+    return ('id',), []
+
+
+class Counters:
+    def __init__(self):
+        self.statements = 0
+        self.parses = 0
+
+    def reset(self):
+        self.statements = 0
+        self.parses = 0
+
+
+counters = Counters()
+
+
+class StubCursor:
+    def __init__(self, cnx, prepared=False, **kwargs):
+        self.cnx = cnx
+        self.prepared = prepared
+        self.seen = set()
+        self.column_names = ()
+        self.lastrowid = 1
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, query, data=(), multi=False):
+        counters.statements += 1
+        if not self.prepared or query not in self.seen:
+            counters.parses += 1
+            self.seen.add(query)
+        if self.cnx.latency:
+            time.sleep(self.cnx.latency)
+        self.column_names, self._rows = self.cnx.responder(query)
+        self.rowcount = len(self._rows)
+        if multi:
+            return iter([self])
+
+    def executemany(self, query, data):
+        data = list(data)
+        self.execute(query, data[0] if data else ())
+        self.rowcount = len(data)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    def __init__(self, responder, latency):
+        self.responder = responder
+        self.latency = latency
+        self.in_transaction = False
+
+    def cursor(self, **kwargs):
+        return StubCursor(self, **kwargs)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def start_transaction(self):
+        self.in_transaction = True
+
+    def commit(self):
+        self.in_transaction = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        pass
+
+
+def install(responder=empty, latency=0.0):
+    '''Answer every pooled connection from the responder instead of a MySQL server.
+
+    Args:
+        responder: Function taking the query and returning (column names, row tuples).
+            Cache version and revocation queries are always answered with no rows.
+        latency: Seconds slept per statement, as a stand-in for the network round trip.
+    '''
+    from server.common import db_connect
+
+    def answer(query):
+        if 'cache_versions' in query or 'revoked_tokens' in query:
+            return empty(query)
+        return responder(query)
+    db_connect.sql_connect = lambda host=None: StubConnection(answer, latency)
+
+
+def best(fn, repeat=5):
+    '''Best wall time of repeated runs of fn, in seconds.'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -3,24 +3,33 @@ import os
 from flask import Flask
 from flasgger import Swagger
 
+from .api.batch import batch
 from .api.customers import customers
 from .api.employees import employees
 from .api.inventory import inventory
 from .api.movies import movies
 from .api.rentals import rentals
+from .api.stats import stats
 from .api.user import user
+from .common.compression import init_compression
+from .common.json_provider import FastJSONProvider
 
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
 
+    app.register_blueprint(batch)
     app.register_blueprint(customers)
     app.register_blueprint(employees)
     app.register_blueprint(inventory)
     app.register_blueprint(movies)
     app.register_blueprint(rentals)
+    app.register_blueprint(stats)
     app.register_blueprint(user)
 
+    init_compression(app)
+
     appTitle = 'Unbreakable API Lite'
 
     app.config['SWAGGER'] = {'title': appTitle}
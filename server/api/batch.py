@@ -0,0 +1,160 @@
+import os
+
+from flask import Blueprint, current_app, request, jsonify
+from mysql.connector import errors
+
+from ..auth.jwt import authorized_as, verify_header
+from ..common.db_connect import sql_session, sql_transaction
+from ..common.responses import error, auth_error
+
+batch = Blueprint('batch', __name__, url_prefix='/api/batch')
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _sub_request(x):
+    if not isinstance(x, dict):
+        raise ValueError('each request must be an object.')
+    method = str(x.get('method', 'GET')).upper()
+    path = x.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        raise ValueError('each request needs a path starting with /api/.')
+    if path.split('?', 1)[0].rstrip('/') == batch.url_prefix:
+        raise ValueError('batch requests cannot be nested.')
+    headers = x.get('headers') or {}
+    if not isinstance(headers, dict):
+        raise ValueError('request headers must be an object.')
+    headers = {k: v for k, v in headers.items()
+               if k.lower() not in ('authorization', 'accept-encoding')}
+    kwargs = {'json': x['body']} if 'body' in x else {}
+    return path, method, headers, kwargs
+
+
+def _dispatch(path, method, headers, kwargs):
+    with current_app.test_request_context(path, method=method, headers=headers, **kwargs):
+        try:
+            res = current_app.full_dispatch_request()
+        except errors.Error as e:
+            res = current_app.make_response(error(str(e)))
+        except Exception:
+            return {'status': 500, 'headers': {}, 'body': {'message': 'internal server error.'}}
+        if res.is_streamed:
+            res.close()
+            return {'status': 400, 'headers': {},
+                    'body': {'message': 'streamed responses cannot be batched, page with limit or call the route directly.'}}
+        data = res.get_data()
+        res.close()
+    if res.is_json and data:
+        body = current_app.json.loads(data)
+    else:
+        body = data.decode() or None
+    res_headers = {k: res.headers[k] for k in ('ETag', 'Content-Type') if k in res.headers}
+    return {'status': res.status_code, 'headers': res_headers, 'body': body}
+
+
+@batch.route('/', methods=['POST'])
+def run():
+    '''Batch endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: false
+          description: Bearer < JWT >, verified once and applied to every sub-request
+        - name: atomic
+          in: query
+          type: boolean
+          required: false
+          description: Run every sub-request in one transaction, rolled back when any of them fails.
+        - name: Requests
+          in: body
+          required: true
+          schema:
+            type: array
+            items:
+                $ref: '#/definitions/SubRequest'
+    definitions:
+        SubRequest:
+            type: object
+            properties:
+                method:
+                    type: string
+                    default: "GET"
+                path:
+                    type: string
+                    description: API path with query string. Streamed routes, i.e. /all without a limit and /export, are answered with a 400.
+                    default: "/api/movies/?id=1"
+                headers:
+                    type: object
+                    description: Request headers, e.g. Accept or If-None-Match.
+                body:
+                    type: object
+                    description: JSON request body.
+        SubResponse:
+            type: object
+            properties:
+                status:
+                    type: integer
+                headers:
+                    type: object
+                body:
+                    type: object
+    responses:
+        200:
+            description: One response per sub-request, in order
+            schema:
+                type: array
+                items:
+                    $ref: '#/definitions/SubResponse'
+        400:
+            description: Invalid batch, or an atomic batch rolled back
+            schema:
+                properties:
+                    message:
+                        type: string
+                    responses:
+                        type: array
+                        items:
+                            $ref: '#/definitions/SubResponse'
+        401:
+            description: Invalid authorization token
+    '''
+    x = request.get_json(silent=True)
+    if not isinstance(x, list) or not x:
+        return error('body must be a non-empty array of requests.')
+    limit = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+    if len(x) > limit:
+        return error(f'at most {limit} requests per batch.')
+    try:
+        subs = [_sub_request(sub) for sub in x]
+    except ValueError as e:
+        return error(str(e))
+
+    user_info = None
+    auth = request.headers.get('Authorization', None)
+    if auth:
+        try:
+            user_info = verify_header(auth)
+        except Exception as e:
+            return auth_error(str(e))
+
+    atomic = request.args.get('atomic', 'false').lower() == 'true'
+    results = []
+    try:
+        with authorized_as(user_info), sql_session():
+            with sql_transaction() if atomic else sql_session():
+                for sub in subs:
+                    results.append(_dispatch(*sub))
+                    if atomic and results[-1]['status'] >= 400:
+                        raise _Rollback()
+    except _Rollback:
+        return jsonify({'message': f'request {len(results) - 1} failed, batch rolled back.',
+                        'responses': results}), 400
+    except Exception as e:
+        if not atomic:
+            raise
+        return jsonify({'message': f'batch rolled back: {e}', 'responses': results}), 400
+    return jsonify(results)
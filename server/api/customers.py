@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
 
-from ..common.responses import success, error
+from ..common.responses import success, error, json_stream, wants_columnar
 from ..auth.jwt import authorize
+from ..common.bulk import bulk_load, require
+from ..common.conditional import conditional
+from ..common.export import export_args, export_response
+from ..common.fieldsets import field_args
+from ..common.multiget import id_args, keyed
+from ..common.pagination import page_args, page
+from ..common.single_flight import single_flight
 from ..models.customer_model import Customer
-from ..data.customer_dao import add_customer, get_all_customers, get_customer, update_customer, delete_customer
+from ..data.customer_dao import add_customer, add_customers, get_all_customers, get_customer, get_customers, update_customer, delete_customer, export_customers, CUSTOMER_FIELDS
 
 customers = Blueprint('customers', __name__, url_prefix='/api/customers')
 
@@ -78,10 +85,88 @@ def create(jwt_info):
     return jsonify({'id': customer_id})
 
 
+@customers.route('/bulk', methods=['POST'])
+@authorize
+def create_bulk(jwt_info):
+    '''Customer bulk create endpoint
+    ---
+    consumes:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: Customers
+          in: body
+          required: true
+          description: One Customer object per line as NDJSON, or CSV with a header row of the Customer fields.
+          schema:
+            type: string
+    definitions:
+        BulkResult:
+            type: object
+            properties:
+                inserted:
+                    type: integer
+                failed:
+                    type: integer
+                results:
+                    type: array
+                    items:
+                        type: object
+                        properties:
+                            line:
+                                type: integer
+                            status:
+                                type: string
+                            message:
+                                type: string
+    responses:
+        200:
+            description: Inserted and failed counts with a result per record
+            schema:
+                $ref: '#/definitions/BulkResult'
+        400:
+            description: Unsupported content type
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    return bulk_load(lambda x: Customer(None, *require(
+        x, 'first', 'last', 'email', 'address', 'city', 'state', 'zip', 'phone')), add_customers)
+
+
 @customers.route('/all', methods=['GET'])
+@conditional('customers')
+@single_flight
 def read_all():
     '''All customers read endpoint
     ---
+    parameters:
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Page size. Returns the page items and a next cursor when set.
+        - name: after
+          in: query
+          type: string
+          required: false
+          description: Cursor from the next field of the previous page.
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: Set to columnar to receive {"columns", "rows"} with one array per row.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetCustomer:
             type: object
@@ -119,10 +204,20 @@ def read_all():
                                 schema:
                                     $ref: '#/definitions/GetCustomer'
     '''
-    return jsonify(get_all_customers())
+    try:
+        limit, after = page_args()
+        fields = field_args(CUSTOMER_FIELDS)
+    except ValueError as e:
+        return error(str(e))
+    columnar = wants_columnar()
+    if limit is not None:
+        return page(get_all_customers(limit + 1, after, columnar=columnar, fields=fields), limit, columnar)
+    return json_stream(get_all_customers(columnar=columnar, fields=fields), columnar)
 
 
 @customers.route('/', methods=['GET'])
+@conditional('customers')
+@single_flight
 def read():
     '''Customer read endpoint
     ---
@@ -130,7 +225,18 @@ def read():
         - name: id
           in: query
           type: integer
-          required: true
+          required: false
+          description: Target ID. Required unless ids is given.
+        - name: ids
+          in: query
+          type: string
+          required: false
+          description: Comma separated IDs. Returns the matching rows keyed by ID.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetCustomer:
             type: object
@@ -161,8 +267,15 @@ def read():
             schema:
                 $ref: '#/definitions/GetCustomer'
     '''
+    try:
+        fields = field_args(CUSTOMER_FIELDS)
+        ids = id_args()
+    except ValueError as e:
+        return error(str(e))
+    if ids is not None:
+        return keyed(get_customers(ids, fields))
     customer_id = request.args.get('id')
-    return jsonify(get_customer(customer_id))
+    return jsonify(get_customer(customer_id, fields))
 
 
 @customers.route('/', methods=['PUT'])
@@ -277,3 +390,55 @@ def delete(jwt_info):
     if res == 0:
         return success('customer removed.')
     return error(res)
+
+
+@customers.route('/export', methods=['GET'])
+@authorize
+def export(jwt_info):
+    '''Customers export endpoint
+    ---
+    produces:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: ndjson (default) or csv.
+        - name: modified_since
+          in: query
+          type: string
+          required: false
+          description: ISO 8601 datetime. Only export customers changed since then.
+        - name: after_id
+          in: query
+          type: integer
+          required: false
+          description: Resume after the last id received by an interrupted export.
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Maximum number of rows to export.
+    responses:
+        200:
+            description: All customers, ordered by id
+        400:
+            description: Invalid export parameters
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    try:
+        fmt, after_id, modified_since, limit = export_args()
+    except ValueError as e:
+        return error(str(e))
+    rows = export_customers(after_id, modified_since, limit)
+    return export_response(rows, fmt, 'customers')
@@ -1,18 +1,47 @@
 from flask import Blueprint, request, jsonify
 
-from ..common.responses import success, error
+from ..common.responses import success, error, json_stream, wants_columnar
 from ..auth.jwt import authorize
+from ..common.conditional import conditional
+from ..common.export import export_args, export_response
+from ..common.fieldsets import field_args
+from ..common.multiget import id_args, keyed
+from ..common.pagination import page_args, page
+from ..common.single_flight import single_flight
 from ..models.employee_model import Employee
 from ..models.user_model import Creds
-from ..data.employee_dao import get_all_employees, get_employee, update_employee, delete_employee
+from ..data.employee_dao import get_all_employees, get_employee, get_employees, update_employee, delete_employee, export_employees, EMPLOYEE_FIELDS
 
 employees = Blueprint('employees', __name__, url_prefix='/api/employees')
 
 
 @employees.route('/all', methods=['GET'])
+@conditional('employees')
+@single_flight
 def read_all():
     '''All employees read endpoint
     ---
+    parameters:
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Page size. Returns the page items and a next cursor when set.
+        - name: after
+          in: query
+          type: string
+          required: false
+          description: Cursor from the next field of the previous page.
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: Set to columnar to receive {"columns", "rows"} with one array per row.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetEmployee:
             type: object
@@ -50,10 +79,20 @@ def read_all():
                                 schema:
                                     $ref: '#/definitions/GetEmployee'
     '''
-    return jsonify(get_all_employees())
+    try:
+        limit, after = page_args()
+        fields = field_args(EMPLOYEE_FIELDS)
+    except ValueError as e:
+        return error(str(e))
+    columnar = wants_columnar()
+    if limit is not None:
+        return page(get_all_employees(limit + 1, after, columnar=columnar, fields=fields), limit, columnar)
+    return json_stream(get_all_employees(columnar=columnar, fields=fields), columnar)
 
 
 @employees.route('/', methods=['GET'])
+@conditional('employees')
+@single_flight
 def read():
     '''Employee read endpoint
     ---
@@ -61,7 +100,18 @@ def read():
         - name: id
           in: query
           type: integer
-          required: true
+          required: false
+          description: Target ID. Required unless ids is given.
+        - name: ids
+          in: query
+          type: string
+          required: false
+          description: Comma separated IDs. Returns the matching rows keyed by ID.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetEmployee:
             type: object
@@ -92,12 +142,19 @@ def read():
             schema:
                 $ref: '#/definitions/GetEmployee'
     '''
+    try:
+        fields = field_args(EMPLOYEE_FIELDS)
+        ids = id_args()
+    except ValueError as e:
+        return error(str(e))
+    if ids is not None:
+        return keyed(get_employees(ids, fields))
     employee_id = request.args.get('id')
-    return jsonify(get_employee(employee_id))
+    return jsonify(get_employee(employee_id, fields))
 
 
 @employees.route('/', methods=['PUT'])
-@authorize
+@authorize(roles='admin')
 def update(jwt_info):
     '''Employee update endpoint
     ---
@@ -163,6 +220,8 @@ def update(jwt_info):
                 properties:
                     error:
                         type: string
+        403:
+            description: Admin role required
     '''
     employee_id = request.args.get('id')
     x = request.get_json()
@@ -175,7 +234,7 @@ def update(jwt_info):
 
 
 @employees.route('/', methods=['DELETE'])
-@authorize
+@authorize(roles='admin')
 def delete(jwt_info):
     '''Employee delete endpoint
     ---
@@ -202,9 +261,63 @@ def delete(jwt_info):
                 properties:
                     error:
                         type: string
+        403:
+            description: Admin role required
     '''
     employee_id = request.args.get('id')
     res = delete_employee(employee_id)
     if res == 0:
         return success('employee removed.')
     return error(res)
+
+
+@employees.route('/export', methods=['GET'])
+@authorize
+def export(jwt_info):
+    '''Employees export endpoint
+    ---
+    produces:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: ndjson (default) or csv.
+        - name: modified_since
+          in: query
+          type: string
+          required: false
+          description: ISO 8601 datetime. Only export employees changed since then.
+        - name: after_id
+          in: query
+          type: integer
+          required: false
+          description: Resume after the last id received by an interrupted export.
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Maximum number of rows to export.
+    responses:
+        200:
+            description: All employees, ordered by id
+        400:
+            description: Invalid export parameters
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    try:
+        fmt, after_id, modified_since, limit = export_args()
+    except ValueError as e:
+        return error(str(e))
+    rows = export_employees(after_id, modified_since, limit)
+    return export_response(rows, fmt, 'employees')
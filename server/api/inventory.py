@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
 
-from ..common.responses import success, error
+from ..common.responses import success, error, json_stream, wants_columnar
 from ..auth.jwt import authorize
+from ..common.bulk import bulk_load, require
+from ..common.conditional import conditional
+from ..common.export import export_args, export_response
+from ..common.fieldsets import field_args
+from ..common.multiget import id_args, keyed
+from ..common.pagination import page_args, page
+from ..common.single_flight import single_flight
 from ..models.inventory_model import Inventory
-from ..data.inventory_dao import add_inventory_item, get_available_inventory, get_inventory, delete_inventory
+from ..data.inventory_dao import add_inventory_item, add_inventory_items, get_available_inventory, get_inventory, get_inventory_items, delete_inventory, export_inventory, INVENTORY_FIELDS
 
 inventory = Blueprint('inventory', __name__, url_prefix='/api/inventory')
 
@@ -53,10 +60,87 @@ def create(jwt_info):
     return jsonify({'id': item_id})
 
 
+@inventory.route('/bulk', methods=['POST'])
+@authorize
+def create_bulk(jwt_info):
+    '''Inventory item bulk create endpoint
+    ---
+    consumes:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: Inventory
+          in: body
+          required: true
+          description: One Inventory object per line as NDJSON, or CSV with a header row of the Inventory fields.
+          schema:
+            type: string
+    definitions:
+        BulkResult:
+            type: object
+            properties:
+                inserted:
+                    type: integer
+                failed:
+                    type: integer
+                results:
+                    type: array
+                    items:
+                        type: object
+                        properties:
+                            line:
+                                type: integer
+                            status:
+                                type: string
+                            message:
+                                type: string
+    responses:
+        200:
+            description: Inserted and failed counts with a result per record
+            schema:
+                $ref: '#/definitions/BulkResult'
+        400:
+            description: Unsupported content type
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    return bulk_load(lambda x: Inventory(*require(x, 'movie_id', 'upc')), add_inventory_items)
+
+
 @inventory.route('/all', methods=['GET'])
+@conditional('inventory')
+@single_flight
 def read_all():
     '''All inventory read endpoint
     ---
+    parameters:
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Page size. Returns the page items and a next cursor when set.
+        - name: after
+          in: query
+          type: string
+          required: false
+          description: Cursor from the next field of the previous page.
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: Set to columnar to receive {"columns", "rows"} with one array per row.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetInventory:
             type: object
@@ -86,10 +170,20 @@ def read_all():
                                 schema:
                                     $ref: '#/definitions/GetInventory'
     '''
-    return jsonify(get_available_inventory())
+    try:
+        limit, after = page_args()
+        fields = field_args(INVENTORY_FIELDS)
+    except ValueError as e:
+        return error(str(e))
+    columnar = wants_columnar()
+    if limit is not None:
+        return page(get_available_inventory(limit + 1, after, columnar=columnar, fields=fields), limit, columnar)
+    return json_stream(get_available_inventory(columnar=columnar, fields=fields), columnar)
 
 
 @inventory.route('/', methods=['GET'])
+@conditional('inventory')
+@single_flight
 def read():
     '''Inventory item read endpoint
     ---
@@ -97,7 +191,18 @@ def read():
         - name: id
           in: query
           type: integer
-          required: true
+          required: false
+          description: Target ID. Required unless ids is given.
+        - name: ids
+          in: query
+          type: string
+          required: false
+          description: Comma separated IDs. Returns the matching rows keyed by ID.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetInventory:
             type: object
@@ -120,8 +225,15 @@ def read():
             schema:
                 $ref: '#/definitions/GetInventory'
     '''
+    try:
+        fields = field_args(INVENTORY_FIELDS)
+        ids = id_args()
+    except ValueError as e:
+        return error(str(e))
+    if ids is not None:
+        return keyed(get_inventory_items(ids, fields))
     inventory_id = request.args.get('id')
-    return jsonify(get_inventory(inventory_id))
+    return jsonify(get_inventory(inventory_id, fields))
 
 
 @inventory.route('/', methods=['DELETE'])
@@ -158,3 +270,55 @@ def delete(jwt_info):
     if res == 0:
         return success('inventory item removed.')
     return error(res)
+
+
+@inventory.route('/export', methods=['GET'])
+@authorize
+def export(jwt_info):
+    '''Inventory export endpoint
+    ---
+    produces:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: ndjson (default) or csv.
+        - name: modified_since
+          in: query
+          type: string
+          required: false
+          description: ISO 8601 datetime. Only export inventory items changed since then.
+        - name: after_id
+          in: query
+          type: integer
+          required: false
+          description: Resume after the last id received by an interrupted export.
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Maximum number of rows to export.
+    responses:
+        200:
+            description: All inventory items, ordered by id
+        400:
+            description: Invalid export parameters
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    try:
+        fmt, after_id, modified_since, limit = export_args()
+    except ValueError as e:
+        return error(str(e))
+    rows = export_inventory(after_id, modified_since, limit)
+    return export_response(rows, fmt, 'inventory')
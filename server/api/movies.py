@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
 
-from ..common.responses import success, error
+from ..common.responses import success, error, json_stream, wants_columnar
 from ..auth.jwt import authorize
+from ..common.bulk import bulk_load, require
+from ..common.conditional import conditional
+from ..common.export import export_args, export_response
+from ..common.fieldsets import field_args
+from ..common.multiget import id_args, keyed
+from ..common.pagination import page_args, page
+from ..common.single_flight import single_flight
 from ..models.movie_model import Movie
-from ..data.movie_dao import add_movie, get_all_movies, get_movie, update_movie, delete_movie
+from ..data.movie_dao import add_movie, add_movies, get_all_movies, get_movie, get_movies, update_movie, delete_movie, export_movies, MOVIE_FIELDS
 
 movies = Blueprint('movies', __name__, url_prefix='/api/movies')
 
@@ -78,10 +85,88 @@ def create(jwt_info):
     return jsonify({'id': movie_id})
 
 
+@movies.route('/bulk', methods=['POST'])
+@authorize
+def create_bulk(jwt_info):
+    '''Movie bulk create endpoint
+    ---
+    consumes:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: Movies
+          in: body
+          required: true
+          description: One Movie object per line as NDJSON, or CSV with a header row of the Movie fields.
+          schema:
+            type: string
+    definitions:
+        BulkResult:
+            type: object
+            properties:
+                inserted:
+                    type: integer
+                failed:
+                    type: integer
+                results:
+                    type: array
+                    items:
+                        type: object
+                        properties:
+                            line:
+                                type: integer
+                            status:
+                                type: string
+                            message:
+                                type: string
+    responses:
+        200:
+            description: Inserted and failed counts with a result per record
+            schema:
+                $ref: '#/definitions/BulkResult'
+        400:
+            description: Unsupported content type
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    return bulk_load(lambda x: Movie(None, '1', *require(
+        x, 'title', 'genres', 'year', 'minutes', 'language', 'actors', 'director', 'imdb')), add_movies)
+
+
 @movies.route('/all', methods=['GET'])
+@conditional('movies')
+@single_flight
 def read_all():
     '''All movies read endpoint
     ---
+    parameters:
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Page size. Returns the page items and a next cursor when set.
+        - name: after
+          in: query
+          type: string
+          required: false
+          description: Cursor from the next field of the previous page.
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: Set to columnar to receive {"columns", "rows"} with one array per row.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetMovie:
             type: object
@@ -123,10 +208,20 @@ def read_all():
                                 schema:
                                     $ref: '#/definitions/GetMovie'
     '''
-    return jsonify(get_all_movies())
+    try:
+        limit, after = page_args()
+        fields = field_args(MOVIE_FIELDS)
+    except ValueError as e:
+        return error(str(e))
+    columnar = wants_columnar()
+    if limit is not None:
+        return page(get_all_movies(limit + 1, after, columnar=columnar, fields=fields), limit, columnar)
+    return json_stream(get_all_movies(columnar=columnar, fields=fields), columnar)
 
 
 @movies.route('/', methods=['GET'])
+@conditional('movie', 'movie:{id}')
+@single_flight
 def read():
     '''Movie read endpoint
     ---
@@ -134,7 +229,18 @@ def read():
         - name: id
           in: query
           type: integer
-          required: true
+          required: false
+          description: Target ID. Required unless ids is given.
+        - name: ids
+          in: query
+          type: string
+          required: false
+          description: Comma separated IDs. Returns the matching rows keyed by ID.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetMovie:
             type: object
@@ -169,8 +275,15 @@ def read():
             schema:
                 $ref: '#/definitions/GetMovie'
     '''
+    try:
+        fields = field_args(MOVIE_FIELDS)
+        ids = id_args()
+    except ValueError as e:
+        return error(str(e))
+    if ids is not None:
+        return keyed(get_movies(ids, fields))
     movie_id = request.args.get('id')
-    return jsonify(get_movie(movie_id))
+    return jsonify(get_movie(movie_id, fields))
 
 
 @movies.route('/', methods=['PUT'])
@@ -285,3 +398,55 @@ def delete(jwt_info):
     if res == 0:
         return success('movie removed.')
     return error(res)
+
+
+@movies.route('/export', methods=['GET'])
+@authorize
+def export(jwt_info):
+    '''Movies export endpoint
+    ---
+    produces:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: ndjson (default) or csv.
+        - name: modified_since
+          in: query
+          type: string
+          required: false
+          description: Not supported for movies.
+        - name: after_id
+          in: query
+          type: integer
+          required: false
+          description: Resume after the last id received by an interrupted export.
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Maximum number of rows to export.
+    responses:
+        200:
+            description: All movies, ordered by id
+        400:
+            description: Invalid export parameters
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    try:
+        fmt, after_id, modified_since, limit = export_args()
+    except ValueError as e:
+        return error(str(e))
+    rows = export_movies(after_id, modified_since, limit)
+    return export_response(rows, fmt, 'movies')
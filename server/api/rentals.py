@@ -1,9 +1,14 @@
 from flask import Blueprint, request, jsonify
 
-from ..common.responses import success, error
+from ..common.responses import success, error, json_stream, wants_columnar
 from ..auth.jwt import authorize
+from ..common.conditional import conditional
+from ..common.export import export_args, export_response
+from ..common.fieldsets import field_args
+from ..common.pagination import page_args, page
+from ..common.single_flight import single_flight
 from ..models.rental_model import Rental, Return
-from ..data.rental_dao import add_rental, get_all_current_rentals, get_current_rental, return_rentals
+from ..data.rental_dao import add_rental, get_all_current_rentals, get_current_rental, return_rentals, export_rentals, RENTAL_FIELDS
 
 rentals = Blueprint('rentals', __name__, url_prefix='/api/rentals')
 
@@ -54,9 +59,32 @@ def create_rental(jwt_info):
 
 
 @rentals.route('/current/all', methods=['GET'])
+@conditional('rentals')
+@single_flight
 def read_all_current():
     '''All current rentals read endpoint
     ---
+    parameters:
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Page size. Returns the page items and a next cursor when set.
+        - name: after
+          in: query
+          type: string
+          required: false
+          description: Cursor from the next field of the previous page.
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: Set to columnar to receive {"columns", "rows"} with one array per row.
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetRental:
             type: object
@@ -88,10 +116,20 @@ def read_all_current():
                                 schema:
                                     $ref: '#/definitions/GetRental'
     '''
-    return jsonify(get_all_current_rentals())
+    try:
+        limit, after = page_args()
+        fields = field_args(RENTAL_FIELDS)
+    except ValueError as e:
+        return error(str(e))
+    columnar = wants_columnar()
+    if limit is not None:
+        return page(get_all_current_rentals(limit + 1, after, columnar=columnar, fields=fields), limit, columnar)
+    return json_stream(get_all_current_rentals(columnar=columnar, fields=fields), columnar)
 
 
 @rentals.route('/current', methods=['GET'])
+@conditional('rentals')
+@single_flight
 def read_current():
     '''Current rental read endpoint
     ---
@@ -100,6 +138,11 @@ def read_current():
           in: query
           type: integer
           required: true
+        - name: fields
+          in: query
+          type: string
+          required: false
+          description: Comma separated columns to return. id is always included.
     definitions:
         GetRental:
             type: object
@@ -124,8 +167,12 @@ def read_current():
             schema:
                 $ref: '#/definitions/GetRental'
     '''
+    try:
+        fields = field_args(RENTAL_FIELDS)
+    except ValueError as e:
+        return error(str(e))
     rental_id = request.args.get('id')
-    return jsonify(get_current_rental(rental_id))
+    return jsonify(get_current_rental(rental_id, fields))
 
 
 @rentals.route('/return', methods=['POST'])
@@ -162,3 +209,55 @@ def create_return(jwt_info):
     if res == 0:
         return success('rental returned.')
     return error(res)
+
+
+@rentals.route('/export', methods=['GET'])
+@authorize
+def export(jwt_info):
+    '''Rental history export endpoint
+    ---
+    produces:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+        - name: format
+          in: query
+          type: string
+          required: false
+          description: ndjson (default) or csv.
+        - name: modified_since
+          in: query
+          type: string
+          required: false
+          description: ISO 8601 datetime. Only export rentals rented or returned since then.
+        - name: after_id
+          in: query
+          type: integer
+          required: false
+          description: Resume after the last id received by an interrupted export.
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: Maximum number of rows to export.
+    responses:
+        200:
+            description: All rentals, current and returned, ordered by id
+        400:
+            description: Invalid export parameters
+            schema:
+                properties:
+                    error:
+                        type: string
+    '''
+    try:
+        fmt, after_id, modified_since, limit = export_args()
+    except ValueError as e:
+        return error(str(e))
+    rows = export_rentals(after_id, modified_since, limit)
+    return export_response(rows, fmt, 'rentals')
@@ -0,0 +1,308 @@
+from flask import Blueprint, jsonify
+
+from ..auth.hash import get_hasher
+from ..auth.jwt import authorize, token_stats
+from ..common.cache import cache
+from ..common.db_connect import pool_stats, query_stats
+from ..common.single_flight import single_flight_stats
+from ..data.user_dao import last_login_stats
+
+stats = Blueprint('stats', __name__, url_prefix='/api/stats')
+
+
+@stats.route('/db/pool', methods=['GET'])
+@authorize(roles='admin')
+def db_pool(jwt_info):
+    '''Database connection pool stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Connection pool usage of the primary and each read replica for the serving worker
+            schema:
+                properties:
+                    primary:
+                        $ref: '#/definitions/PoolStats'
+                    replicas:
+                        type: object
+                        additionalProperties:
+                            $ref: '#/definitions/PoolStats'
+        403:
+            description: Admin role required
+    definitions:
+        PoolStats:
+            type: object
+            properties:
+                size:
+                    type: integer
+                overflow:
+                    type: integer
+                open:
+                    type: integer
+                in_use:
+                    type: integer
+                idle:
+                    type: integer
+                waits:
+                    type: integer
+                wait_time:
+                    type: number
+                lag:
+                    type: number
+                    description: Replication lag in seconds, replicas only.
+                healthy:
+                    type: boolean
+                    description: Whether reads are routed to the replica, replicas only.
+    '''
+    return jsonify(pool_stats())
+
+
+@stats.route('/db/queries', methods=['GET'])
+@authorize(roles='admin')
+def db_queries(jwt_info):
+    '''Database query stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Query latency aggregates by query fingerprint for the serving worker, slowest total time first
+            schema:
+                properties:
+                    Queries:
+                        type: array
+                        items:
+                            $ref: '#/definitions/QueryStats'
+        403:
+            description: Admin role required
+    definitions:
+        QueryStats:
+            type: object
+            properties:
+                query:
+                    type: string
+                    description: Query with literals replaced by ?.
+                origin:
+                    type: string
+                    description: DAO function issuing the query.
+                count:
+                    type: integer
+                errors:
+                    type: integer
+                total_ms:
+                    type: number
+                mean_ms:
+                    type: number
+                p50_ms:
+                    type: number
+                p95_ms:
+                    type: number
+                p99_ms:
+                    type: number
+                max_ms:
+                    type: number
+                rows:
+                    type: integer
+                acquire_ms:
+                    type: number
+                    description: Total time spent checking out connections.
+                histogram:
+                    type: object
+                    description: Execution count per latency bucket upper bound in milliseconds.
+    '''
+    return jsonify(query_stats())
+
+
+@stats.route('/cache', methods=['GET'])
+@authorize(roles='admin')
+def dao_cache(jwt_info):
+    '''DAO result cache stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: DAO result cache usage for the serving worker
+            schema:
+                properties:
+                    CacheStats:
+                        type: object
+                        properties:
+                            size:
+                                type: integer
+                            maxsize:
+                                type: integer
+                            ttl:
+                                type: number
+                            hits:
+                                type: integer
+                            misses:
+                                type: integer
+        403:
+            description: Admin role required
+    '''
+    return jsonify(cache.stats())
+
+
+@stats.route('/hash', methods=['GET'])
+@authorize(roles='admin')
+def hash_pool(jwt_info):
+    '''Password hashing pool stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Password hashing pool usage for the serving worker
+            schema:
+                properties:
+                    HashStats:
+                        type: object
+                        properties:
+                            workers:
+                                type: integer
+                            queue:
+                                type: integer
+                            pending:
+                                type: integer
+                                description: Hashes running or waiting for a worker.
+                            peak:
+                                type: integer
+                            completed:
+                                type: integer
+                            rejected:
+                                type: integer
+                                description: Hashes refused with 503 after HASH_TIMEOUT.
+                            hash_time:
+                                type: number
+                            queue_time:
+                                type: number
+                                description: Total seconds spent waiting for a slot or worker.
+                            max_queue_time:
+                                type: number
+        403:
+            description: Admin role required
+    '''
+    return jsonify(get_hasher().stats())
+
+
+@stats.route('/logins', methods=['GET'])
+@authorize(roles='admin')
+def logins(jwt_info):
+    '''Buffered last login writes stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Write-behind buffer of last_login updates for the serving worker
+            schema:
+                properties:
+                    WriteBehindStats:
+                        type: object
+                        properties:
+                            pending:
+                                type: integer
+                                description: Users with a login not written yet.
+                            flushes:
+                                type: integer
+                            written:
+                                type: integer
+                            failures:
+                                type: integer
+        403:
+            description: Admin role required
+    '''
+    return jsonify(last_login_stats())
+
+
+@stats.route('/tokens', methods=['GET'])
+@authorize(roles='admin')
+def tokens(jwt_info):
+    '''Verified token cache stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Verified token cache usage for the serving worker
+            schema:
+                properties:
+                    CacheStats:
+                        type: object
+                        properties:
+                            size:
+                                type: integer
+                            maxsize:
+                                type: integer
+                            ttl:
+                                type: number
+                            hits:
+                                type: integer
+                            misses:
+                                type: integer
+        403:
+            description: Admin role required
+    '''
+    return jsonify(token_stats())
+
+
+@stats.route('/coalescing', methods=['GET'])
+@authorize(roles='admin')
+def coalescing(jwt_info):
+    '''Request coalescing stats endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Identical concurrent GET requests answered by a single view run, for the serving worker
+            schema:
+                properties:
+                    CoalescingStats:
+                        type: object
+                        properties:
+                            leaders:
+                                type: integer
+                                description: Requests that ran the view.
+                            followers:
+                                type: integer
+                                description: Requests that waited for a leader.
+                            timeouts:
+                                type: integer
+                                description: Followers that ran the view themselves after SINGLE_FLIGHT_TIMEOUT.
+                            in_flight:
+                                type: integer
+        403:
+            description: Admin role required
+    '''
+    return jsonify(single_flight_stats())
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 
-from ..common.responses import success, auth_error
+from ..common.responses import success, error, auth_error, unavailable
+from ..auth.hash_pool import HashBusy
 from ..auth.jwt import authorize, encode_jwt
+from ..auth.revocation import revoke_token
 from ..models.user_model import User, Creds
-from ..data.user_dao import add_user, auth_user, get_role, set_role
+from ..data.user_dao import auth_user, create_user
 
 user = Blueprint('user', __name__, url_prefix='/api/user')
 
@@ -55,17 +57,21 @@ def create():
                 properties:
                     auth_error:
                         type: string
+        503:
+            description: Password hashing queue full
     '''
     x = request.get_json()
     payload = Creds(x['email'], x['password'])
     user_role = 'employee'
-    user_id = add_user(payload)
+    try:
+        user_id = create_user(payload, user_role)
+    except HashBusy:
+        return unavailable('too many logins in progress, retry shortly.')
     try:
         user_id = int(user_id)
     except ValueError:
         return auth_error('unable to create user.')
-    set_role(user_id, user_role)
-    user = auth_user(payload)
+    user = User(user_id).as_dict()
     user['token'] = encode_jwt({'id': user_id, 'role': user_role})
     return jsonify(user)
 
@@ -117,18 +123,54 @@ def auth():
                 properties:
                     auth_error:
                         type: string
+        503:
+            description: Password hashing queue full
     '''
     x = request.get_json()
     payload = Creds(x['email'], x['password'])
-    user = auth_user(payload)
-    if user is None or user == -1:
+    try:
+        res = auth_user(payload)
+    except HashBusy:
+        return unavailable('too many logins in progress, retry shortly.')
+    if res is None or res == -1:
         return auth_error('unable to authenticate user.')
+    user, user_role = res
     user_id = user['info']['id']
-    user_role = get_role(user_id)['role']
     user['token'] = encode_jwt({'id': user_id, 'role': user_role})
     return jsonify(user)
 
 
+@user.route('/logout', methods=['POST'])
+@authorize
+def logout(jwt_info):
+    '''User logout endpoint
+    ---
+    parameters:
+        - name: Authorization
+          in: header
+          type: string
+          required: true
+          description: Bearer < JWT >
+    responses:
+        200:
+            description: Token revoked
+            schema:
+                properties:
+                    message:
+                        type: string
+        400:
+            description: Unable to revoke token
+            schema:
+                properties:
+                    message:
+                        type: string
+    '''
+    res = revoke_token(jwt_info)
+    if res == 0:
+        return success('logged out.')
+    return error(res)
+
+
 @user.route('/self/role', methods=['GET'])
 @authorize
 def self_role(jwt_info):
@@ -1,6 +1,16 @@
 import binascii
 import hashlib
+import hmac
 import os
+import threading
+
+from .hash_pool import HashPool
+
+LEGACY_PARAMS = {'algorithm': 'pbkdf2_sha256', 'iterations': 100000}
+
+_hasher = None
+_hasher_pid = None
+_hasher_lock = threading.Lock()
 
 
 def get_salt():
@@ -13,30 +23,102 @@ def get_salt():
     return str(binascii.hexlify(salt).decode('utf-8'))
 
 
-def hash_password(password, salt):
-    '''Create a password hash from the given password and salt.
+def hash_params():
+    '''Hashing algorithm and cost parameters for new password hashes.
+
+    HASH_ALGORITHM selects pbkdf2_sha256 (HASH_PBKDF2_ITERATIONS) or scrypt
+    (HASH_SCRYPT_N, HASH_SCRYPT_R, HASH_SCRYPT_P).
+
+    Returns:
+        dict: The return value. Algorithm name and its parameters.
+    '''
+    algorithm = os.environ.get('HASH_ALGORITHM', 'pbkdf2_sha256')
+    if algorithm == 'scrypt':
+        return {
+            'algorithm': 'scrypt',
+            'n': int(os.environ.get('HASH_SCRYPT_N', 16384)),
+            'r': int(os.environ.get('HASH_SCRYPT_R', 8)),
+            'p': int(os.environ.get('HASH_SCRYPT_P', 1))
+        }
+    if algorithm != 'pbkdf2_sha256':
+        raise ValueError(f'unsupported HASH_ALGORITHM {algorithm}.')
+    return {
+        'algorithm': 'pbkdf2_sha256',
+        'iterations': int(os.environ.get('HASH_PBKDF2_ITERATIONS', 100000))
+    }
+
+
+def derive(password, salt, params):
+    '''Create a password hash with the given algorithm parameters.
 
     Args:
         password: Plain text password.
         salt: Salt in hex form.
+        params: Algorithm name and its parameters, as returned by hash_params().
 
     Returns:
-        string: The return value. Resulting password hash.
+        string: The return value. Resulting password hash in hex form.
     '''
-    key = hashlib.pbkdf2_hmac(
-        'sha256', password.encode(), salt.encode(), 100000)
+    if params['algorithm'] == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        key = hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                             maxmem=256 * n * r + (1 << 20))
+    elif params['algorithm'] == 'pbkdf2_sha256':
+        key = hashlib.pbkdf2_hmac(
+            'sha256', password.encode(), salt.encode(), params['iterations'])
+    else:
+        raise ValueError(f'unsupported password algorithm {params["algorithm"]}.')
     return str(binascii.hexlify(key).decode('utf-8'))
 
 
-def check_password(password, hashed, salt):
-    '''Check if the provided password matches the original password hash.
+def get_hasher():
+    '''Retrieve the hashing pool of the current worker process, creating it on first use.
+
+    Returns:
+        HashPool: The return value. Pool sized by HASH_WORKERS, HASH_QUEUE and HASH_TIMEOUT.
+    '''
+    global _hasher, _hasher_pid
+    if _hasher_pid == os.getpid():
+        return _hasher
+    with _hasher_lock:
+        if _hasher_pid != os.getpid():
+            _hasher = HashPool(
+                workers=int(os.environ.get('HASH_WORKERS', 2)),
+                queue=int(os.environ.get('HASH_QUEUE', 8)),
+                timeout=float(os.environ.get('HASH_TIMEOUT', 5))
+            )
+            _hasher_pid = os.getpid()
+        return _hasher
+
+
+def make_password(password):
+    '''Hash a new password on the hashing pool with the current parameters.
 
     Args:
         password: Plain text password.
-        hashed: Hash of the original password.
-        salt: Salt in hex form.
 
     Returns:
-        boolean: The return value. Result of the password comparison.
+        dict: The return value. Algorithm parameters, salt and hash to store as JSON.
+    '''
+    params = hash_params()
+    salt = get_salt()
+    hashed = get_hasher().run(derive, password, salt, params)
+    return dict(params, salt=salt, hash=hashed)
+
+
+def verify_password(password, stored):
+    '''Check a password against a stored hash on the hashing pool.
+
+    Stored hashes without an algorithm are PBKDF2-SHA256 with 100,000 iterations.
+
+    Args:
+        password: Plain text password.
+        stored: Stored dict with the algorithm parameters, salt and hash.
+
+    Returns:
+        tuple: The return value. Whether the password matches, and whether the stored
+            hash uses outdated parameters and should be replaced with make_password().
     '''
-    return hash_password(password, salt) == hashed
+    params = {k: v for k, v in stored.items() if k not in ('salt', 'hash')} or LEGACY_PARAMS
+    hashed = get_hasher().run(derive, password, stored['salt'], params)
+    return hmac.compare_digest(hashed, stored['hash']), params != hash_params()
@@ -0,0 +1,121 @@
+import atexit
+import multiprocessing
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class HashBusy(Exception):
+    '''Raised when no hashing slot frees up before the queue timeout.'''
+
+
+def _timed(fn, args):
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+
+class HashPool:
+    '''Bounded pool of worker processes running password hashing off the request threads.
+
+    At most `workers` hashes run at once and up to `queue` more wait for a free worker.
+    Callers beyond that block for up to `timeout` seconds and then get HashBusy, so a
+    login burst queues here instead of occupying every request thread.
+
+    Args:
+        workers: Number of hashing processes. 0 hashes on the calling thread.
+        queue: Number of hashes allowed to wait for a free worker.
+        timeout: Seconds to wait for a slot before raising HashBusy.
+    '''
+
+    def __init__(self, workers=2, queue=8, timeout=5):
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._peak = 0
+        self._completed = 0
+        self._rejected = 0
+        self._hash_time = 0.0
+        self._queue_time = 0.0
+        self._max_queue_time = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(self.close)
+            return self._executor
+
+    def run(self, fn, *args):
+        '''Run fn(*args) on a hashing process and wait for the result.
+
+        Args:
+            fn: Module level function, picklable along with its arguments.
+            args: Arguments passed to fn.
+
+        Returns:
+            object: The return value. Result of fn.
+        '''
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._rejected += 1
+            raise HashBusy(f'no hashing slot available after {self.timeout}s.')
+        try:
+            with self._lock:
+                self._pending += 1
+                self._peak = max(self._peak, self._pending)
+            if self.workers == 0:
+                result, elapsed = _timed(fn, args)
+            else:
+                executor = self._get_executor()
+                try:
+                    result, elapsed = executor.submit(_timed, fn, args).result()
+                except BrokenProcessPool:
+                    with self._lock:
+                        if self._executor is executor:
+                            self._executor = None
+                    raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+        waited = time.monotonic() - start - elapsed
+        with self._lock:
+            self._completed += 1
+            self._hash_time += elapsed
+            self._queue_time += waited
+            self._max_queue_time = max(self._max_queue_time, waited)
+        return result
+
+    def close(self):
+        '''Shut the hashing processes down. Registered to run at exit once they are started.'''
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        '''Snapshot of the pool usage counters.
+
+        Returns:
+            dict: The return value. Workers, queue, pending, peak, completed, rejected, hash_time, queue_time and max_queue_time.
+        '''
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue': self.queue,
+                'pending': self._pending,
+                'peak': self._peak,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'hash_time': round(self._hash_time, 3),
+                'queue_time': round(self._queue_time, 3),
+                'max_queue_time': round(self._max_queue_time, 3)
+            }
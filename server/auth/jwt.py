@@ -1,34 +1,147 @@
+import contextvars
 import os
+import time
+import uuid
+from contextlib import contextmanager
 from flask import request, g
-from functools import wraps
-from jose import jwt
+from functools import lru_cache, wraps
+from jose import jwk, jwt
 
-from ..common.responses import auth_error
+from ..common.cache import TTLCache
+from ..common.responses import auth_error, forbidden
+from .revocation import is_revoked
+
+_tokens = TTLCache(
+    maxsize=int(os.environ.get('JWT_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('JWT_CACHE_TTL', 300))
+)
+
+
+@lru_cache(maxsize=None)
+def signing_key():
+    '''Build the HS256 key from JWT_SECRET once per process.
+
+    Returns:
+        Key: The return value. Key used to sign and verify tokens.
+    '''
+    return jwk.construct(os.environ['JWT_SECRET'], 'HS256')
 
 
 def encode_jwt(token):
-    return jwt.encode(token, os.environ['JWT_SECRET'], algorithm='HS256')
+    now = int(time.time())
+    claims = dict(token, iat=now, exp=now + int(os.environ.get('JWT_TTL', 86400)),
+                  jti=uuid.uuid4().hex)
+    return jwt.encode(claims, signing_key(), algorithm='HS256')
 
 
 def decode_jwt(token):
-    return jwt.decode(token, os.environ['JWT_SECRET'], algorithms=['HS256'])
+    return jwt.decode(token, signing_key(), algorithms=['HS256'])
+
+
+def verify_token(token):
+    '''Decode a token, reusing the claims of the same token verified before.
+
+    Verified claims are kept in a bounded LRU until the token's exp claim passes,
+    or for at most JWT_CACHE_TTL seconds.
+
+    Args:
+        token: Encoded JWT.
+
+    Returns:
+        dict: The return value. Verified token claims.
+    '''
+    hit, claims = _tokens.get(token)
+    if hit:
+        return claims
+    claims = decode_jwt(token)
+    expires = None
+    if 'exp' in claims:
+        expires = time.monotonic() + claims['exp'] - time.time()
+    _tokens.set(token, claims, (), (), expires)
+    return claims
+
+
+def token_stats():
+    '''Retrieve the usage of the verified token cache for the current worker.
+
+    Returns:
+        dict: The return value. Entry count, hits and misses.
+    '''
+    return _tokens.stats()
+
+
+_authorized = contextvars.ContextVar('authorized', default=None)
+
+
+@contextmanager
+def authorized_as(user_info):
+    '''Treat every authorize() check in the block as passed with already verified claims.
+
+    Used to dispatch internal sub-requests without decoding the token again.
+
+    Args:
+        user_info: Decoded token claims, or None to require a token as usual.
+    '''
+    token = _authorized.set(user_info)
+    try:
+        yield
+    finally:
+        _authorized.reset(token)
+
+
+def verify_header(auth):
+    '''Decode the token of a Bearer Authorization header and refuse revoked tokens.
+
+    Args:
+        auth: Authorization header value.
+
+    Returns:
+        dict: The return value. Verified token claims.
+    '''
+    token = auth.split()
+    if len(token) != 2 or token[0].lower() != 'bearer':
+        raise ValueError('token formatting invalid.')
+    user_info = verify_token(token[1])
+    if is_revoked(user_info):
+        raise ValueError('token has been revoked.')
+    return user_info
+
+
+def authorize(f=None, roles=None):
+    '''Decorator requiring a valid bearer token, and optionally one of the given roles.
+
+    Usable bare (@authorize) or with a policy (@authorize(roles=('admin',))). The roles
+    are compiled to a frozenset once, when the route is defined, and checked against the
+    role claim of the token alone.
 
+    Args:
+        f: View function taking the token claims as its first argument.
+        roles: Role name or iterable of role names allowed to call the view. Any role when None.
+    '''
+    if f is None:
+        return lambda f: authorize(f, roles)
+    if isinstance(roles, str):
+        roles = (roles,)
+    allowed = frozenset(roles) if roles is not None else None
 
-def authorize(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        user_info = {}
-        auth = request.headers.get('Authorization', None)
-        if not auth:
-            return auth_error('no authorization token provided.')
+        user_info = _authorized.get()
+        if user_info is None:
+            auth = request.headers.get('Authorization', None)
+            if not auth:
+                return auth_error('no authorization token provided.')
+            try:
+                user_info = verify_header(auth)
+            except Exception as e:
+                return auth_error(str(e))
         try:
-            token = auth.split()
-            if len(token) != 2 or token[0].lower() != 'bearer':
-                return auth_error('token formatting invalid.')
-            user_info = decode_jwt(token[1])
             g.id = user_info['id']
-            g.role = user_info['role']
+            g.role = role = user_info['role']
         except Exception as e:
             return auth_error(str(e))
+        if allowed is not None and role not in allowed:
+            return forbidden('insufficient role.')
         return f(user_info, *args, **kwargs)
+    decorated.roles = allowed
     return decorated
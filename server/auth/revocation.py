@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+
+from datetime import datetime
+
+from ..common.bloom import BloomFilter
+from ..common.db_connect import after_commit
+from ..data.revocation_dao import add_revocation, get_active_revocations, get_revocation
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationUnavailable(Exception):
+    '''Raised when revocations cannot be checked because the database is unreachable.'''
+
+
+class _Revocations:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._loaded = 0.0
+        self._pid = None
+        self.refresh = float(os.environ.get('JWT_REVOCATION_REFRESH', 30))
+
+    def _load(self):
+        rows = get_active_revocations()
+        if isinstance(rows, str):
+            raise RevocationUnavailable(rows)
+        keys = [x[0] for x in list(rows)[1:]]
+        bloom = BloomFilter(
+            capacity=max(int(os.environ.get('JWT_REVOCATION_CAPACITY', 100000)), 2 * len(keys)),
+            error_rate=float(os.environ.get('JWT_REVOCATION_ERROR_RATE', 0.01)))
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def current(self):
+        refresh = self.refresh
+        if self._pid == os.getpid() and self._filter is not None:
+            if time.monotonic() - self._loaded <= refresh or not self._lock.acquire(blocking=False):
+                return self._filter
+        else:
+            self._lock.acquire()
+        try:
+            if self._pid != os.getpid():
+                self._filter, self._pid = None, os.getpid()
+            if self._filter is None or time.monotonic() - self._loaded > refresh:
+                try:
+                    self._filter = self._load()
+                except Exception as e:
+                    if self._filter is None:
+                        raise RevocationUnavailable(str(e))
+                    logger.warning('token revocation refresh failed: %s', e)
+                self._loaded = time.monotonic()
+            return self._filter
+        finally:
+            self._lock.release()
+
+    def add(self, key):
+        bloom = self._filter
+        if bloom is not None and self._pid == os.getpid():
+            bloom.add(key)
+
+
+_revocations = _Revocations()
+
+
+def _revoke(key, expires):
+    now = datetime.fromtimestamp(int(time.time()))
+    res = add_revocation(key, now, expires)
+    if not isinstance(res, str):
+        after_commit(lambda: _revocations.add(key))
+    return res
+
+
+def revoke_token(claims):
+    '''Revoke a single token.
+
+    Args:
+        claims: Verified token claims with jti and exp.
+
+    Returns:
+        int: The return value. 0 if successful.
+    '''
+    if 'jti' not in claims or 'exp' not in claims:
+        return 'token cannot be revoked.'
+    return _revoke(f'jti:{claims["jti"]}', datetime.fromtimestamp(claims['exp']))
+
+
+def revoke_user(user_id):
+    '''Revoke every token issued to the user so far.
+
+    Args:
+        user_id: Target user ID.
+
+    Returns:
+        int: The return value. 0 if successful.
+    '''
+    ttl = int(os.environ.get('JWT_TTL', 86400))
+    return _revoke(f'user:{user_id}', datetime.fromtimestamp(int(time.time()) + ttl))
+
+
+def _confirmed(key, iat):
+    res = get_revocation(key)
+    if isinstance(res, str):
+        raise RevocationUnavailable(res)
+    if not res:
+        return False
+    return iat is None or iat <= res[0]['revoked_on'].timestamp()
+
+
+def is_revoked(claims):
+    '''Check whether a verified token was revoked.
+
+    Keys are looked up in the worker's Bloom filter of the revoked_tokens table, refreshed
+    every JWT_REVOCATION_REFRESH seconds, and only filter hits are confirmed against the table.
+    Rows keyed jti:<token ID> revoke one token, rows keyed user:<user ID> every token
+    issued to the user up to revoked_on.
+
+    Args:
+        claims: Verified token claims.
+
+    Returns:
+        boolean: The return value. True if the token must be refused.
+    '''
+    bloom = _revocations.current()
+    key = f'jti:{claims["jti"]}' if 'jti' in claims else None
+    if key is not None and key in bloom and _confirmed(key, None):
+        return True
+    key = f'user:{claims["id"]}'
+    return key in bloom and _confirmed(key, claims.get('iat'))
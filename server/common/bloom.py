@@ -0,0 +1,44 @@
+import hashlib
+import math
+import struct
+
+
+class BloomFilter:
+    '''Fixed size set membership filter with no false negatives.
+
+    Membership tests may return false positives at roughly `error_rate` once
+    `capacity` keys were added, so hits have to be confirmed against the exact set.
+
+    Args:
+        capacity: Expected number of keys.
+        error_rate: Target false positive rate at capacity.
+    '''
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.bits = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = min(max(int(round(self.bits / capacity * math.log(2))), 1), 16)
+        self._array = bytearray((self.bits + 7) // 8)
+        self._unpack = struct.Struct(f'<{self.hashes}I').unpack
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.hashes).digest()
+        return [x % self.bits for x in self._unpack(digest)]
+
+    def add(self, key):
+        '''Add a key to the filter.
+
+        Args:
+            key: String key.
+        '''
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        array = self._array
+        for pos in self._positions(key):
+            if not array[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
@@ -0,0 +1,127 @@
+import csv
+import json
+import os
+
+from flask import request, jsonify
+
+from .responses import error
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+CSV_TYPES = ('text/csv',)
+
+
+def _decoded_lines(bad):
+    for line_no, line in enumerate(request.stream, start=1):
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            bad.append(line_no)
+            return
+
+
+def read_records():
+    '''Parse the request body one record at a time, without buffering it.
+
+    NDJSON bodies hold one JSON object per line. CSV bodies start with a header row.
+    Lines that are not valid UTF-8 are reported on their own. For CSV bodies reading
+    stops there, since the rows after it cannot be split reliably.
+
+    Returns:
+        generator: The return value. (line number, dict) pairs, or (line number, Exception) for unreadable lines.
+    '''
+    bad = []
+    if request.mimetype in CSV_TYPES:
+        reader = csv.DictReader(_decoded_lines(bad))
+        for record in reader:
+            yield reader.line_num, record
+        if bad:
+            yield bad[0], ValueError('line is not valid UTF-8, the rest of the body was not read.')
+        return
+    for line_no, line in enumerate(request.stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+            if not isinstance(record, dict):
+                raise ValueError('record must be a JSON object.')
+            yield line_no, record
+        except UnicodeDecodeError:
+            yield line_no, ValueError('line is not valid UTF-8.')
+        except ValueError as e:
+            yield line_no, e
+
+
+def require(record, *fields):
+    '''Read required, non-empty values from a record.
+
+    Args:
+        record: Parsed record dict.
+        fields: Names of the required fields.
+
+    Returns:
+        tuple: The return value. Field values in the given order.
+    '''
+    values = []
+    for field in fields:
+        value = record.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            raise ValueError(f'missing field {field}.')
+        values.append(value.strip() if isinstance(value, str) else value)
+    return tuple(values)
+
+
+def bulk_load(to_model, add_many):
+    '''Validate streamed records and write them in batched multi-row inserts.
+
+    Each batch of BULK_BATCH_SIZE rows is written in its own transaction. A failing batch
+    is rolled back and split in halves until the rows causing the error are written, and
+    reported, on their own.
+
+    Args:
+        to_model: Function building a model object from a record dict. Raises ValueError when invalid.
+        add_many: DAO function writing a list of model objects. Returns an error string on failure.
+
+    Returns:
+        Response: The return value. Inserted and failed counts plus a result per record.
+    '''
+    if request.mimetype not in NDJSON_TYPES + CSV_TYPES:
+        return error(f'content type must be one of: {", ".join(NDJSON_TYPES + CSV_TYPES)}.')
+    size = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+    results = []
+    batch = []
+    counts = {'inserted': 0, 'failed': 0}
+
+    def write(rows):
+        res = add_many([x for _, x in rows])
+        if isinstance(res, str) and len(rows) > 1:
+            half = len(rows) // 2
+            write(rows[:half])
+            write(rows[half:])
+            return
+        for line_no, _ in rows:
+            if isinstance(res, str):
+                results.append({'line': line_no, 'status': 'error', 'message': res})
+            else:
+                results.append({'line': line_no, 'status': 'ok'})
+        counts['failed' if isinstance(res, str) else 'inserted'] += len(rows)
+
+    def flush():
+        write(list(batch))
+        batch.clear()
+
+    for line_no, record in read_records():
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append((line_no, to_model(record)))
+        except ValueError as e:
+            results.append({'line': line_no, 'status': 'error', 'message': str(e)})
+            counts['failed'] += 1
+            continue
+        if len(batch) >= size:
+            flush()
+    if batch:
+        flush()
+
+    results.sort(key=lambda x: x['line'])
+    return jsonify({'inserted': counts['inserted'], 'failed': counts['failed'], 'results': results})
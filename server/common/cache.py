@@ -0,0 +1,262 @@
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from flask import g, has_request_context
+from functools import wraps
+
+from .db_connect import after_commit, in_transaction, primary_reads
+from ..data.version_dao import bump_versions, get_versions
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    '''Size bounded LRU cache whose entries expire after a TTL and can be dropped by tag.
+
+    Every tag carries a version that is bumped when the tag is invalidated, so a value
+    read from the database before a concurrent write can be refused instead of cached.
+
+    Args:
+        maxsize: Maximum number of entries. 0 disables the cache.
+        ttl: Seconds an entry stays valid.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''Retrieve a live entry and mark it as recently used.
+
+        Args:
+            key: Cache key.
+
+        Returns:
+            tuple: The return value. (True, value) on a hit, (False, None) on a miss.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return False, None
+
+    def versions(self, tags):
+        '''Current versions of the given tags, to be handed back to set().
+
+        Args:
+            tags: Iterable of tags.
+
+        Returns:
+            tuple: The return value. Version of each tag.
+        '''
+        with self._lock:
+            return tuple(self._versions.get(x, 0) for x in tags)
+
+    def set(self, key, value, tags, versions, expires=None):
+        '''Store a value unless one of its tags was invalidated since versions were read.
+
+        Args:
+            key: Cache key.
+            value: Value to store.
+            tags: Tags the entry is invalidated by.
+            versions: Tag versions read before the value was loaded.
+            expires: time.monotonic() deadline ending the entry before the TTL passes.
+        '''
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if tuple(self._versions.get(x, 0) for x in tags) != versions:
+                return
+            if key in self._entries:
+                self._drop(key)
+            deadline = time.monotonic() + self.ttl
+            if expires is not None:
+                deadline = min(deadline, expires)
+            self._entries[key] = (value, deadline, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        '''Drop every entry carrying one of the given tags and bump the tag versions.
+
+        Args:
+            tags: Tags to invalidate.
+        '''
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def stats(self):
+        '''Current usage of the cache.
+
+        Returns:
+            dict: The return value. Entry count, hits and misses.
+        '''
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+cache = TTLCache(
+    maxsize=int(os.environ.get('DAO_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('DAO_CACHE_TTL', 300))
+)
+
+
+_shared_lock = threading.Lock()
+_shared = {}
+
+
+def tag_versions(tags):
+    '''Versions of the given tags shared by every worker, from the cache_versions table.
+
+    Versions are read from the primary and kept by the worker for CACHE_VERSION_TTL
+    seconds, so cache hits and 304s are answered from memory. Writes made by other workers
+    therefore retire entries and ETags within that bound. Within a request the versions
+    are read at most once and re-read after the request invalidates them.
+
+    Args:
+        tags: Iterable of tags.
+
+    Returns:
+        tuple: The return value. Version of each tag, or None when the table cannot be read.
+    '''
+    memo = g.setdefault('_tag_versions', {}) if has_request_context() else {}
+    missing = [x for x in tags if x not in memo]
+    if missing:
+        ttl = float(os.environ.get('CACHE_VERSION_TTL', 1))
+        now = time.monotonic()
+        with _shared_lock:
+            for tag in missing:
+                entry = _shared.get(tag)
+                if entry is not None and entry[0] is not None and now - entry[1] < ttl:
+                    memo[tag] = entry[0]
+        stale = [x for x in missing if x not in memo]
+        if stale:
+            with primary_reads():
+                rows = get_versions(stale)
+            if isinstance(rows, str):
+                return None
+            found = {x['tag']: x['version'] for x in rows}
+            with _shared_lock:
+                for tag in stale:
+                    memo[tag] = found.get(tag, 0)
+                    entry = _shared.get(tag)
+                    # A bump made while the versions were read wins over them.
+                    if entry is None or entry[1] <= now:
+                        _shared[tag] = (memo[tag], now)
+                if len(_shared) > 4 * max(cache.maxsize, 1024):
+                    for tag in [k for k, v in _shared.items() if now - v[1] >= ttl]:
+                        del _shared[tag]
+    return tuple(memo[x] for x in tags)
+
+
+def unpaged_variant(limit=None, after=0, columnar=False, fields=None):
+    '''Check whether a list read returns every row in anything but its default form.
+
+    Used as the skip function of cached() list reads, so the cache holds at most one
+    full copy of a table instead of one per format and field combination.
+
+    Returns:
+        boolean: The return value. True when limit is None and columnar or fields is set.
+    '''
+    return limit is None and (bool(columnar) or fields is not None)
+
+
+def cached(*tags, skip=None):
+    '''Decorator caching the result of a DAO read until the TTL passes or a tag is invalidated.
+
+    Tags are formatted with the call arguments, e.g. 'movie:{0}'. Iterators are read into
+    a list before being cached and error strings are never cached. Misses are read from
+    the primary so a lagging replica cannot fill the cache with rows older than a write.
+    Entries are keyed by the shared tag versions, so a write made by another worker
+    retires them right away instead of after the TTL. Reads inside a transaction bypass
+    the cache, since they may see writes that are later rolled back.
+
+    Args:
+        tags: Tags the cached results are invalidated by.
+        skip: Function taking the call arguments, True for calls that bypass the cache.
+    '''
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if cache.maxsize <= 0 or in_transaction() or (skip is not None and skip(*args, **kwargs)):
+                return f(*args, **kwargs)
+            entry_tags = tuple(x.format(*args, **kwargs) for x in tags)
+            key = (f.__module__, f.__name__, args, tuple(sorted(kwargs.items())),
+                   tag_versions(entry_tags))
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            versions = cache.versions(entry_tags)
+            with primary_reads():
+                value = f(*args, **kwargs)
+                if isinstance(value, str):
+                    return value
+                if not isinstance(value, (list, dict)):
+                    try:
+                        value = list(value)
+                    except Exception as e:
+                        return str(e)
+            cache.set(key, value, entry_tags, versions)
+            return value
+        return decorated
+    return decorator
+
+
+def _bump_shared(tags):
+    res = bump_versions(sorted(set(tags)))
+    if isinstance(res, str):
+        logger.warning('bumping cache versions of %s failed: %s', tags, res)
+    now = time.monotonic()
+    with _shared_lock:
+        for tag in tags:
+            _shared[tag] = (None, now)
+
+
+def invalidate(*tags):
+    '''Retire the cached reads and ETags carrying the given tags.
+
+    Local entries are dropped right away and again once the write is committed, since
+    fills made while the transaction is open still read the old rows. The shared tag
+    versions are then bumped in the cache_versions table in a statement of their own, so
+    a failed bump is only logged and never holds locks for the length of the write.
+
+    Args:
+        tags: Tags to invalidate.
+    '''
+    if has_request_context():
+        memo = g.get('_tag_versions', {})
+        for tag in tags:
+            memo.pop(tag, None)
+    cache.invalidate(*tags)
+    if in_transaction():
+        after_commit(lambda: cache.invalidate(*tags))
+    after_commit(lambda: _bump_shared(tags))
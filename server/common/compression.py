@@ -0,0 +1,113 @@
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+
+def _level(name, default):
+    return int(os.environ.get(f'COMPRESS_{name}_LEVEL', default))
+
+
+def available_encodings():
+    '''Content codings supported by the installed libraries, most preferred first.
+
+    Returns:
+        list: The return value. Encoding names as used in Accept-Encoding.
+    '''
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        if encoding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(
+                level=_level('ZSTD', 3)).compressobj()
+            self.compress, self._finish = self._obj.compress, self._obj.flush
+        elif encoding == 'br':
+            self._obj = brotli.Compressor(quality=_level('BR', 4))
+            self.compress, self._finish = self._obj.process, self._obj.finish
+        else:
+            self._obj = zlib.compressobj(_level('GZIP', 6), zlib.DEFLATED, 31)
+            self.compress, self._finish = self._obj.compress, self._obj.flush
+
+    def finish(self):
+        return self._finish()
+
+
+def _compress_stream(chunks, compressor, source):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(source, 'close'):
+            source.close()
+
+
+def compress_response(response):
+    '''Compress the response body with the best encoding accepted by the client.
+
+    Buffered bodies smaller than COMPRESS_MIN_SIZE bytes are left alone. Streamed bodies
+    are compressed chunk by chunk as they are written.
+
+    Args:
+        response: Outgoing Response object.
+
+    Returns:
+        Response: The return value. The same response, compressed when worthwhile.
+    '''
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    compressor = _Compressor(encoding)
+    if response.is_streamed:
+        response.response = _compress_stream(
+            response.iter_encoded(), compressor, response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < int(os.environ.get('COMPRESS_MIN_SIZE', 500)):
+            return response
+        response.set_data(compressor.compress(data) + compressor.finish())
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def init_compression(app):
+    '''Register negotiated response compression on the app.
+
+    Args:
+        app: Flask application.
+    '''
+    app.after_request(compress_response)
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import time
+
+from flask import g, request, make_response
+from functools import wraps
+
+from .cache import cache, tag_versions
+from .db_connect import in_transaction
+
+_BOOT = os.urandom(8).hex()
+
+
+def etag_for(tags):
+    '''Build a strong ETag for the current request from the versions of the given tags.
+
+    Tag versions are bumped by the DAO write paths in the cache_versions table, so every
+    worker hands out the same ETag for the same data. Without the table the ETag falls back
+    to the versions of this worker and changes once per cache TTL, so writes made by other
+    worker processes are picked up within the same bound.
+
+    Args:
+        tags: Tags the response data depends on.
+
+    Returns:
+        string: The return value. Unquoted ETag value.
+    '''
+    accept = request.headers.get('Accept', '')
+    shared = tag_versions(tags)
+    if shared is not None:
+        raw = f'{request.full_path}:{accept}:{shared}'
+    else:
+        window = int(time.time() // cache.ttl) if cache.ttl > 0 else 0
+        raw = f'{_BOOT}:{os.getpid()}:{window}:{request.full_path}:{accept}:{cache.versions(tags)}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional(*tags):
+    '''Decorator answering If-None-Match with 304 Not Modified before the view runs.
+
+    Tags are formatted with the request query arguments, e.g. 'movie:{id}'. ETags carrying
+    a content coding suffix added by compression match the uncompressed ETag. Responses
+    built inside a transaction, e.g. in an atomic batch, carry no ETag. The ETag is kept
+    in g._etag while the view runs so single_flight only shares bodies built for it.
+
+    Args:
+        tags: Tags the response data depends on.
+    '''
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if in_transaction():
+                return f(*args, **kwargs)
+            try:
+                entry_tags = tuple(x.format(**request.args.to_dict()) for x in tags)
+            except KeyError:
+                return f(*args, **kwargs)
+            etag = etag_for(entry_tags)
+            if any(x.split('-', 1)[0] == etag for x in request.if_none_match):
+                res = make_response('', 304)
+                res.set_etag(etag)
+                return res
+            g._etag = etag
+            try:
+                res = make_response(f(*args, **kwargs))
+            finally:
+                g.pop('_etag', None)
+            if res.status_code == 200:
+                res.set_etag(etag)
+            res.vary.add('Accept')
+            return res
+        return decorated
+    return decorator
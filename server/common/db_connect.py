@@ -1,21 +1,320 @@
 import mysql.connector
 import os
+import threading
+import time
 
+from contextlib import contextmanager
+from flask import g, has_request_context
+from mysql.connector import errors
 
-def sql_connect():
+from .db_metrics import Sample, caller, metrics
+from .db_pool import ConnectionPool
+from .db_replicas import ReplicaSet
+
+_pools = {}
+_pools_pid = None
+_replicas = None
+_pools_lock = threading.RLock()
+_local = threading.local()
+
+
+def sql_connect(host=None):
     '''Connect to the MySQL database using credentials from class properties.
 
+    Args:
+        host: Database host. Defaults to the primary DB_HOST.
+
     Returns:
         MySQLConnection: The return value. Object to perform MySQL actions on.
     '''
     return mysql.connector.connect(
-        host=os.environ['DB_HOST'],
+        host=host or os.environ['DB_HOST'],
         user=os.environ['DB_USER'],
         password=os.environ['DB_PSWD'],
         database=os.environ['DB_DATA']
     )
 
 
+def get_pool(host=None):
+    '''Retrieve the connection pool of a host for the current worker process, creating it on first use.
+
+    Args:
+        host: Database host. Defaults to the primary DB_HOST.
+
+    Returns:
+        ConnectionPool: The return value. Pool sized from the DB_POOL_* environment variables.
+    '''
+    global _pools, _pools_pid, _replicas
+    host = host or os.environ['DB_HOST']
+    pool = _pools.get(host) if _pools_pid == os.getpid() else None
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools, _replicas, _pools_pid = {}, None, os.getpid()
+        if host not in _pools:
+            _pools[host] = ConnectionPool(
+                lambda: sql_connect(host),
+                size=int(os.environ.get('DB_POOL_SIZE', 5)),
+                overflow=int(os.environ.get('DB_POOL_OVERFLOW', 10)),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+                recycle=float(os.environ.get('DB_POOL_RECYCLE', 3600))
+            )
+        return _pools[host]
+
+
+def get_replicas():
+    '''Retrieve the read replicas listed in DB_REPLICA_HOSTS for the current worker process.
+
+    Returns:
+        ReplicaSet: The return value. None if no replicas are configured.
+    '''
+    global _replicas
+    hosts = [x.strip() for x in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if x.strip()]
+    if not hosts:
+        return None
+    get_pool()  # resets the per-process state after a fork
+    if _replicas is not None:
+        return _replicas
+    with _pools_lock:
+        if _replicas is None:
+            _replicas = ReplicaSet(
+                {host: get_pool(host) for host in hosts},
+                max_lag=float(os.environ.get('DB_REPLICA_MAX_LAG', 5)),
+                check_interval=float(os.environ.get('DB_REPLICA_LAG_CHECK', 10))
+            )
+        return _replicas
+
+
+def pool_stats():
+    '''Retrieve usage statistics for the current worker's connection pools.
+
+    Returns:
+        dict: The return value. Open, in use and idle connections plus checkout waits for the primary and each replica.
+    '''
+    replicas = get_replicas()
+    return {
+        'primary': get_pool().stats(),
+        'replicas': replicas.stats() if replicas else {}
+    }
+
+
+def _last_write():
+    if has_request_context():
+        return g.get('_db_last_write', 0.0)
+    return getattr(_local, 'last_write', 0.0)
+
+
+def _mark_write():
+    now = time.monotonic()
+    if has_request_context():
+        g._db_last_write = now
+    else:
+        _local.last_write = now
+
+
+def _read_pool():
+    if getattr(_local, 'primary', 0):
+        return None
+    replicas = get_replicas()
+    if replicas is None:
+        return None
+    window = float(os.environ.get('DB_READ_YOUR_WRITES', 5))
+    if _last_write() and time.monotonic() - _last_write() < window:
+        return None
+    if not has_request_context():
+        host = replicas.choose()
+        return (replicas, host) if host else None
+    # One replica per request, so a read is never older than the reads before it.
+    if '_db_replica' not in g:
+        g._db_replica = replicas.choose()
+    host = g._db_replica
+    if host is None or not replicas.is_healthy(host):
+        return None
+    return replicas, host
+
+
+@contextmanager
+def primary_reads():
+    '''Route every read in the block to the primary.
+
+    Used for reads whose results outlive the request, such as cache fills, so a lagging
+    replica cannot hand back rows older than a write that was already committed.
+    '''
+    depth = getattr(_local, 'primary', 0)
+    _local.primary = depth + 1
+    try:
+        yield
+    finally:
+        _local.primary = depth
+
+
+def _acquire(read=False):
+    route = _read_pool() if read else None
+    if route is not None:
+        replicas, host = route
+        pool = get_pool(host)
+        try:
+            return pool, pool.acquire()
+        except Exception:
+            replicas.mark_down(host)
+    pool = get_pool()
+    return pool, pool.acquire()
+
+
+class _Transaction:
+    def __init__(self, cnx=None, autocommit=False):
+        self.cnx = cnx
+        self.autocommit = autocommit
+        self.discard = False
+        self.failed = False
+        self.callbacks = []
+
+
+def _bound_connection():
+    tx = getattr(_local, 'tx', None)
+    if tx is None:
+        return None
+    if tx.cnx is None:
+        tx.cnx = get_pool().acquire()
+        if tx.autocommit:
+            return tx.cnx
+        try:
+            tx.cnx.start_transaction()
+        except Exception:
+            get_pool().release(tx.cnx, discard=True)
+            tx.cnx = None
+            raise
+    return tx.cnx
+
+
+@contextmanager
+def _measure(query, data, origin=None):
+    sample = Sample()
+    origin = origin or caller()
+    start = time.perf_counter()
+    try:
+        yield sample
+    except Exception:
+        sample.error = True
+        raise
+    finally:
+        metrics.record(query, data, time.perf_counter() - start, sample, origin)
+
+
+@contextmanager
+def _checkout(read=False, sample=None):
+    start = time.perf_counter()
+    bound = _bound_connection()
+    if sample is not None:
+        sample.acquire = time.perf_counter() - start
+    if bound is not None:
+        try:
+            yield get_pool(), bound
+        except (errors.InterfaceError, errors.OperationalError):
+            _local.tx.discard = _local.tx.failed = True
+            raise
+        except Exception:
+            _local.tx.failed = True
+            raise
+        return
+    pool, cnx = _acquire(read)
+    if sample is not None:
+        sample.acquire = time.perf_counter() - start
+    discard = False
+    try:
+        yield pool, cnx
+    except (errors.InterfaceError, errors.OperationalError):
+        discard = True
+        raise
+    finally:
+        pool.release(cnx, discard=discard)
+
+
+def in_transaction():
+    '''Check whether the current thread is inside sql_transaction().
+
+    Returns:
+        boolean: The return value. True if statements are bound to a transaction.
+    '''
+    tx = getattr(_local, 'tx', None)
+    return tx is not None and not tx.autocommit
+
+
+@contextmanager
+def sql_session():
+    '''Run every statement in the block on one connection, each committing on its own.
+
+    Statements keep their usual error handling. A sql_transaction() block inside the
+    session runs on the session connection. Nested sessions join the outer one.
+    '''
+    if getattr(_local, 'tx', None) is not None:
+        yield
+        return
+    tx = _local.tx = _Transaction(autocommit=True)
+    try:
+        yield
+    finally:
+        _local.tx = None
+        if tx.cnx is not None:
+            get_pool().release(tx.cnx, discard=tx.discard)
+
+
+@contextmanager
+def sql_transaction():
+    '''Run every statement in the block on one connection and commit them together.
+
+    The connection is checked out on the first statement and released when the block exits.
+    Statements inside the block raise instead of returning the error string, and any
+    exception rolls the whole block back. A failed statement rolls the block back even
+    when its exception is handled inside the block. Nested blocks join the outer transaction.
+    '''
+    if in_transaction():
+        yield
+        return
+    session = getattr(_local, 'tx', None)
+    tx = _local.tx = _Transaction(cnx=session.cnx if session is not None else None)
+    try:
+        if tx.cnx is not None:
+            tx.cnx.start_transaction()
+        yield
+        if tx.failed:
+            raise errors.DatabaseError(msg='transaction rolled back after a failed statement.')
+        if tx.cnx is not None:
+            tx.cnx.commit()
+            _mark_write()
+    except BaseException:
+        if tx.cnx is not None:
+            try:
+                tx.cnx.rollback()
+            except Exception:
+                tx.discard = True
+        raise
+    finally:
+        _local.tx = session
+        if session is not None:
+            session.cnx = tx.cnx
+            session.discard = session.discard or tx.discard
+        elif tx.cnx is not None:
+            get_pool().release(tx.cnx, discard=tx.discard)
+    for callback in tx.callbacks:
+        callback()
+
+
+def after_commit(callback):
+    '''Run the callback once the current transaction commits, or right away outside of one.
+
+    Callbacks of a transaction that rolls back are dropped.
+
+    Args:
+        callback: Function taking no arguments.
+    '''
+    if not in_transaction():
+        callback()
+    else:
+        _local.tx.callbacks.append(callback)
+
+
 def sql_command(query, data):
     '''Execute the given query against the MySQL connection.
 
@@ -26,39 +325,197 @@ def sql_command(query, data):
     Returns:
         int: The return value. Row ID (auto-increment column) if insert. 0 if anything else.
     '''
-    cnx = sql_connect()
-    cursor = cnx.cursor()
+    bound = in_transaction()
     try:
-        cursor.execute(query, data)
-        row_id = cursor.lastrowid
-        cnx.commit()
-        return row_id
+        with _measure(query, data) as sample, _checkout(sample=sample) as (pool, cnx):
+            cursor = cnx.cursor()
+            try:
+                cursor.execute(query, data)
+                row_id = cursor.lastrowid
+                sample.rows = cursor.rowcount
+                if not bound:
+                    cnx.commit()
+                _mark_write()
+                return row_id
+            finally:
+                cursor.close()
     except Exception as e:
+        if bound:
+            raise
         return str(e)
-    finally:
-        cursor.close()
-        cnx.close()
 
 
-def sql_select(query, data):
+def sql_command_many(query, data):
+    '''Execute the given query once per set of variables in a single round trip.
+
+    Inserts are sent as one multi-row INSERT statement.
+
+    Args:
+        query: Target query to execute.
+        data: Sequence of variable tuples to inject in the query.
+
+    Returns:
+        int: The return value. Number of rows affected.
+    '''
+    bound = in_transaction()
+    try:
+        with _measure(query, data) as sample, _checkout(sample=sample) as (pool, cnx):
+            cursor = cnx.cursor()
+            try:
+                cursor.executemany(query, data)
+                row_count = sample.rows = cursor.rowcount
+                if not bound:
+                    cnx.commit()
+                _mark_write()
+                return row_count
+            finally:
+                cursor.close()
+    except Exception as e:
+        if bound:
+            raise
+        return str(e)
+
+
+def _prepared_cursor(pool, cnx, query):
+    statements = pool.statements(cnx)
+    if query in statements:
+        statements.move_to_end(query)
+        return statements[query]
+    cursor = cnx.cursor(prepared=True)
+    statements[query] = (cursor, query)
+    if len(statements) > int(os.environ.get('DB_STATEMENT_CACHE', 32)):
+        evicted, _ = statements.popitem(last=False)[1]
+        try:
+            evicted.close()
+        except Exception:
+            pass
+    return statements[query]
+
+
+def sql_lookup(query, data):
+    '''Execute the given select statement as a server-side prepared statement.
+
+    The statement is prepared once per pooled connection and reused by later calls,
+    so hot lookups skip parsing and planning.
+
+    Args:
+        query: Target select statement to execute, with %s placeholders.
+        data: Variables to bind to the placeholders.
+
+    Returns:
+        list: The return value. Row results from the select statement.
+    '''
+    bound = in_transaction()
+    try:
+        with _measure(query, data) as sample, _checkout(read=True, sample=sample) as (pool, cnx):
+            cursor, query = _prepared_cursor(pool, cnx, query)
+            try:
+                cursor.execute(query, data)
+                res = [dict(zip(cursor.column_names, x))
+                       for x in cursor.fetchall()]
+                sample.rows = len(res)
+            except Exception:
+                pool.statements(cnx).pop(query, None)
+                cursor.close()
+                raise
+            if not bound:
+                cnx.commit()
+            return res
+    except Exception as e:
+        if bound:
+            raise
+        return str(e)
+
+
+def sql_select(query, data, columnar=False):
     '''Execute the given select statement against the MySQL connection.
 
     Args:
         query: Target select statement to execute.
         data: Variables to inject in the select statement.
+        columnar: Return the column names followed by row tuples instead of dicts.
 
     Returns:
         list: The return value. Row results from the select statement.
     '''
-    cnx = sql_connect()
-    cursor = cnx.cursor()
+    bound = in_transaction()
     try:
-        rows = [x.fetchall() for x in cursor.execute(query, data, multi=True)]
-        res = [dict(zip(cursor.column_names, x)) for x in rows[0]]
-        cnx.commit()
-        return res
+        with _measure(query, data) as sample, _checkout(read=True, sample=sample) as (pool, cnx):
+            cursor = cnx.cursor()
+            try:
+                rows = [x.fetchall()
+                        for x in cursor.execute(query, data, multi=True)]
+                if columnar:
+                    res = [tuple(cursor.column_names)] + rows[0]
+                else:
+                    res = [dict(zip(cursor.column_names, x)) for x in rows[0]]
+                sample.rows = len(rows[0])
+                if not bound:
+                    cnx.commit()
+                return res
+            finally:
+                cursor.close()
     except Exception as e:
+        if bound:
+            raise
         return str(e)
-    finally:
-        cursor.close()
-        cnx.close()
+
+
+def sql_select_iter(query, data, size=None, columnar=False):
+    '''Stream the rows of the given select statement using an unbuffered cursor.
+
+    Inside sql_transaction() the rows are buffered on the bound connection so it stays usable.
+
+    Args:
+        query: Target select statement to execute.
+        data: Variables to inject in the select statement.
+        size: Rows fetched per round trip. Defaults to DB_FETCH_SIZE.
+        columnar: Yield the column names first, then row tuples instead of dicts.
+
+    Returns:
+        generator: The return value. Row results from the select statement, one dict at a time.
+    '''
+    size = size or int(os.environ.get('DB_FETCH_SIZE', 500))
+    return _iter_rows(query, data, size, columnar, caller())
+
+
+def _iter_rows(query, data, size, columnar, origin):
+    with _measure(query, data, origin) as sample:
+        start = time.perf_counter()
+        bound = _bound_connection()
+        pool, cnx = _acquire(read=True) if bound is None else (None, bound)
+        sample.acquire = time.perf_counter() - start
+        cursor = cnx.cursor(buffered=bound is not None)
+        done = False
+        try:
+            cursor.execute(query, data)
+            columns = cursor.column_names
+            if columnar:
+                yield tuple(columns)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                sample.rows += len(rows)
+                if columnar:
+                    yield from rows
+                    continue
+                for row in rows:
+                    yield dict(zip(columns, row))
+            done = True
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                done = False
+            if pool is not None:
+                pool.release(cnx, discard=not done)
+
+
+def query_stats():
+    '''Retrieve latency, row and connection acquire aggregates for the current worker.
+
+    Returns:
+        list: The return value. Per query fingerprint aggregates, slowest total time first.
+    '''
+    return metrics.snapshot()
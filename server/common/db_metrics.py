@@ -0,0 +1,173 @@
+import logging
+import os
+import re
+import sys
+import threading
+
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES = re.compile(r'(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+_SPACE = re.compile(r'\s+')
+_SENSITIVE = re.compile(r'\b(?:users|customers|revoked_tokens)\b', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    '''Normalize a query so statements differing only by their values share one key.
+
+    Args:
+        query: SQL statement.
+
+    Returns:
+        string: The return value. Query with literals and placeholders replaced by ?.
+    '''
+    query = _STRING.sub('?', query)
+    query = _PLACEHOLDER.sub('?', query)
+    query = _NUMBER.sub('?', query)
+    query = _VALUES.sub(r'\1, ...', query)
+    query = _IN_LIST.sub('(...)', query)
+    return _SPACE.sub(' ', query).strip().rstrip(';')
+
+
+def _describe(value):
+    if isinstance(value, (str, bytes, bytearray)):
+        return f'<{type(value).__name__} len={len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def redact(query, data):
+    '''Replace the parameters of statements on tables holding credentials or personal data.
+
+    Args:
+        query: SQL statement.
+        data: Variables injected in the statement, or a sequence of them for executemany.
+
+    Returns:
+        object: The return value. data unchanged, or their types and lengths for users, customers and revoked_tokens statements.
+    '''
+    if not data or not _SENSITIVE.search(query):
+        return data
+    if isinstance(data, dict):
+        return {k: _describe(v) for k, v in data.items()}
+    if all(isinstance(x, (tuple, list)) for x in data):
+        return f'<{len(data)} rows>'
+    return tuple(_describe(x) for x in data)
+
+
+class Sample:
+    '''Measurements of a single statement filled in while it runs.'''
+
+    def __init__(self):
+        self.rows = 0
+        self.acquire = 0.0
+        self.error = False
+
+
+class QueryMetrics:
+    '''Latency histograms, row counts and connection acquire time keyed by query fingerprint.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, query, data, elapsed, sample, origin=None):
+        '''Add one statement execution to the aggregates and log it if slow.
+
+        Args:
+            query: SQL statement.
+            data: Variables injected in the statement.
+            elapsed: Total seconds spent, including connection checkout.
+            sample: Sample class object.
+            origin: DAO function that issued the statement.
+        '''
+        key = fingerprint(query)
+        ms = elapsed * 1000
+        bucket = next((i for i, x in enumerate(BUCKETS_MS) if ms <= x), len(BUCKETS_MS))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'origin': origin,
+                    'count': 0,
+                    'errors': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'rows': 0,
+                    'acquire_ms': 0.0,
+                    'buckets': [0] * (len(BUCKETS_MS) + 1)
+                }
+            stats['count'] += 1
+            stats['errors'] += sample.error
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['rows'] += sample.rows
+            stats['acquire_ms'] += sample.acquire * 1000
+            stats['buckets'][bucket] += 1
+        if ms >= float(os.environ.get('DB_SLOW_QUERY_MS', 500)):
+            logger.warning('slow query %.1fms from %s: %s %r',
+                           ms, origin, query, redact(query, data))
+
+    def snapshot(self):
+        '''Aggregates for every fingerprint, slowest total time first.
+
+        Returns:
+            list: The return value. Counts, mean/p50/p95/p99/max latency, rows and acquire time per fingerprint.
+        '''
+        with self._lock:
+            items = [(key, dict(stats, buckets=list(stats['buckets'])))
+                     for key, stats in self._stats.items()]
+        res = []
+        for key, stats in items:
+            count = stats['count']
+            res.append({
+                'query': key,
+                'origin': stats['origin'],
+                'count': count,
+                'errors': stats['errors'],
+                'total_ms': round(stats['total_ms'], 3),
+                'mean_ms': round(stats['total_ms'] / count, 3),
+                'p50_ms': _percentile(stats['buckets'], count, 0.50, stats['max_ms']),
+                'p95_ms': _percentile(stats['buckets'], count, 0.95, stats['max_ms']),
+                'p99_ms': _percentile(stats['buckets'], count, 0.99, stats['max_ms']),
+                'max_ms': round(stats['max_ms'], 3),
+                'rows': stats['rows'],
+                'acquire_ms': round(stats['acquire_ms'], 3),
+                'histogram': dict(zip([str(x) for x in BUCKETS_MS] + ['inf'], stats['buckets']))
+            })
+        return sorted(res, key=lambda x: x['total_ms'], reverse=True)
+
+
+def _percentile(buckets, count, q, max_ms):
+    target = q * count
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= target:
+            return min(BUCKETS_MS[i], round(max_ms, 3)) if i < len(BUCKETS_MS) else round(max_ms, 3)
+    return round(max_ms, 3)
+
+
+def caller():
+    '''Find the DAO function that issued the statement being measured.
+
+    Returns:
+        string: The return value. Module and function name, None if not called from the data layer.
+    '''
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if '.data.' in module:
+            return f'{module.rsplit(".", 1)[-1]}.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+metrics = QueryMetrics()
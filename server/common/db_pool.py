@@ -0,0 +1,161 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class PoolTimeout(Exception):
+    '''Raised when no connection could be checked out before the pool timeout.'''
+
+
+class ConnectionPool:
+    '''Thread safe pool of MySQL connections.
+
+    Holds up to `size` idle connections and opens up to `overflow` extra connections
+    under load. Connections are pinged on checkout and replaced once older than `recycle`.
+
+    Args:
+        connect: Callable returning a new MySQLConnection.
+        size: Number of connections kept open when idle.
+        overflow: Number of connections allowed above size.
+        timeout: Seconds to wait for a free connection before raising PoolTimeout.
+        recycle: Maximum connection age in seconds. 0 disables recycling.
+    '''
+
+    def __init__(self, connect, size=5, overflow=10, timeout=30, recycle=3600):
+        self._connect = connect
+        self.size = size
+        self.overflow = overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._cond = threading.Condition()
+        self._idle = []
+        self._created = {}
+        self._statements = {}
+        self._open = 0
+        self._in_use = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def acquire(self):
+        '''Check out a live connection, opening a new one if the pool has room.
+
+        Returns:
+            MySQLConnection: The return value. Connection to release back with release().
+        '''
+        start = time.monotonic()
+        waited = False
+        cnx = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    cnx = self._idle.pop()
+                    break
+                if self._open < self.size + self.overflow:
+                    self._open += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._wait_time += time.monotonic() - start
+                    raise PoolTimeout(
+                        f'no connection available after {self.timeout}s.')
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+            if waited:
+                self._wait_time += time.monotonic() - start
+
+        try:
+            if cnx is not None and not self._usable(cnx):
+                self._close(cnx)
+                cnx = None
+            if cnx is None:
+                cnx = self._connect()
+                self._created[id(cnx)] = time.monotonic()
+            return cnx
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, cnx, discard=False):
+        '''Return a checked out connection to the pool.
+
+        Args:
+            cnx: Connection previously returned by acquire().
+            discard: Close the connection instead of keeping it idle.
+        '''
+        if not discard:
+            try:
+                if cnx.in_transaction:
+                    cnx.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or len(self._idle) >= self.size:
+                self._open -= 1
+            else:
+                self._idle.append(cnx)
+                cnx = None
+            self._cond.notify()
+        if cnx is not None:
+            self._close(cnx)
+
+    def statements(self, cnx):
+        '''Retrieve the prepared statement cache of a pooled connection.
+
+        Args:
+            cnx: Connection checked out from this pool.
+
+        Returns:
+            OrderedDict: The return value. Prepared cursors keyed by query, dropped with the connection.
+        '''
+        return self._statements.setdefault(id(cnx), OrderedDict())
+
+    def close(self):
+        '''Close every idle connection held by the pool.'''
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for cnx in idle:
+            self._close(cnx)
+
+    def stats(self):
+        '''Current usage of the pool.
+
+        Returns:
+            dict: The return value. Pool sizing and checkout counters.
+        '''
+        with self._cond:
+            return {
+                'size': self.size,
+                'overflow': self.overflow,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6)
+            }
+
+    def _usable(self, cnx):
+        created = self._created.get(id(cnx), 0)
+        if self.recycle and time.monotonic() - created > self.recycle:
+            return False
+        try:
+            cnx.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _close(self, cnx):
+        self._created.pop(id(cnx), None)
+        self._statements.pop(id(cnx), None)
+        try:
+            cnx.close()
+        except Exception:
+            pass
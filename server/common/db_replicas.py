@@ -0,0 +1,104 @@
+import itertools
+import threading
+import time
+
+
+class ReplicaSet:
+    '''Round robin selection over read replicas that skips lagging or unreachable hosts.
+
+    Replication lag is sampled at most once per `check_interval` seconds per replica.
+
+    Args:
+        pools: Dict of replica host to ConnectionPool.
+        max_lag: Seconds of replication lag above which a replica is skipped.
+        check_interval: Seconds between lag checks of a replica.
+    '''
+
+    def __init__(self, pools, max_lag=5, check_interval=10):
+        self.pools = pools
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._hosts = list(pools)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._state = {host: {'lag': None, 'healthy': True, 'checked': 0.0, 'checking': False}
+                       for host in self._hosts}
+
+    def choose(self):
+        '''Pick the next healthy replica.
+
+        Returns:
+            string: The return value. Replica host, None if no replica is usable.
+        '''
+        for _ in range(len(self._hosts)):
+            host = self._hosts[next(self._next) % len(self._hosts)]
+            self._refresh(host)
+            if self._state[host]['healthy']:
+                return host
+        return None
+
+    def is_healthy(self, host):
+        '''Check whether reads may still be routed to the replica, without a new lag check.
+
+        Args:
+            host: Replica host.
+
+        Returns:
+            boolean: The return value. True if the replica is healthy.
+        '''
+        with self._lock:
+            return self._state[host]['healthy']
+
+    def mark_down(self, host):
+        '''Skip the replica until its next lag check, e.g. after a connection failure.
+
+        Args:
+            host: Replica host.
+        '''
+        with self._lock:
+            self._state[host].update(healthy=False, checked=time.monotonic())
+
+    def stats(self):
+        '''Current health of every replica.
+
+        Returns:
+            dict: The return value. Lag, health and pool stats keyed by replica host.
+        '''
+        with self._lock:
+            return {host: dict(lag=state['lag'], healthy=state['healthy'], **self.pools[host].stats())
+                    for host, state in self._state.items()}
+
+    def _refresh(self, host):
+        state = self._state[host]
+        with self._lock:
+            if state['checking'] or time.monotonic() - state['checked'] < self.check_interval:
+                return
+            state['checking'] = True
+        lag = self._lag(host)
+        with self._lock:
+            state.update(lag=lag, healthy=lag is not None and lag <= self.max_lag,
+                         checked=time.monotonic(), checking=False)
+
+    def _lag(self, host):
+        pool = self.pools[host]
+        try:
+            cnx = pool.acquire()
+        except Exception:
+            return None
+        discard = False
+        try:
+            cursor = cnx.cursor(dictionary=True)
+            try:
+                cursor.execute('SHOW REPLICA STATUS;')
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+            if not row:
+                return None
+            lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+            return None if lag is None else float(lag)
+        except Exception:
+            discard = True
+            return None
+        finally:
+            pool.release(cnx, discard=discard)
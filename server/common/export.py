@@ -0,0 +1,105 @@
+import csv
+import datetime
+import io
+
+from flask import Response, current_app, request, stream_with_context
+
+from .responses import error
+
+
+def export_args():
+    '''Read the export query parameters of the current request.
+
+    modified_since takes an ISO 8601 date or datetime. A trailing Z or a UTC offset is
+    converted to the server's local time, in which rows are stamped.
+
+    Returns:
+        tuple: The return value. Format (ndjson or csv), after_id, modified_since datetime or None and limit or None.
+    '''
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        raise ValueError('format must be ndjson or csv.')
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit else None
+    except ValueError:
+        raise ValueError('after_id and limit must be integers.')
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be positive.')
+    modified_since = request.args.get('modified_since')
+    if modified_since:
+        try:
+            if modified_since.endswith(('Z', 'z')):
+                modified_since = modified_since[:-1] + '+00:00'
+            modified_since = datetime.datetime.fromisoformat(modified_since)
+        except ValueError:
+            raise ValueError('modified_since must be an ISO 8601 date or datetime.')
+    if modified_since and modified_since.tzinfo is not None:
+        # Rows are stamped with naive local datetime.now(), so compare in local time.
+        modified_since = modified_since.astimezone().replace(tzinfo=None)
+    return fmt, after_id, modified_since or None, limit
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.replace(microsecond=0).isoformat()
+    return value
+
+
+def export_response(rows, fmt, name):
+    '''Stream rows as NDJSON or CSV with constant memory.
+
+    Rows are ordered by id, so an interrupted export resumes with after_id set to the
+    last id received.
+
+    Args:
+        rows: Columnar rows from the DAO (column names first, then row tuples), or an error string.
+        fmt: ndjson or csv.
+        name: File name used in the Content-Disposition header, without extension.
+
+    Returns:
+        Response: The return value. Streamed export.
+    '''
+    if isinstance(rows, str):
+        return error(rows)
+    rows = iter(rows)
+    try:
+        columns = next(rows, None) or ()
+    except Exception as e:
+        return error(str(e))
+
+    def generate_ndjson():
+        dumps = current_app.json.dumps
+        chunk, size = [], 0
+        for row in rows:
+            line = dumps(dict(zip(columns, row))) + '\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= 65536:
+                yield ''.join(chunk)
+                chunk, size = [], 0
+        yield ''.join(chunk)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_csv_value(x) for x in row])
+            if buffer.tell() >= 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate():
+        try:
+            yield from generate_csv() if fmt == 'csv' else generate_ndjson()
+        finally:
+            if hasattr(rows, 'close'):
+                rows.close()
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    headers = {'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
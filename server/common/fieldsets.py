@@ -0,0 +1,37 @@
+from flask import request
+
+
+def field_args(allowed):
+    '''Read the comma separated fields query parameter of the current request.
+
+    The id column is always included so rows can still be paged and keyed. The other
+    columns are sorted, so the same set of fields always selects, and caches, the same way.
+
+    Args:
+        allowed: Columns that may be requested from the view.
+
+    Returns:
+        tuple: The return value. Requested columns, None to select every column.
+    '''
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = [x.strip() for x in fields.split(',') if x.strip()]
+    unknown = [x for x in fields if x not in allowed]
+    if unknown:
+        raise ValueError(f'unknown fields: {", ".join(unknown)}.')
+    return ('id',) + tuple(sorted(set(fields) - {'id'}))
+
+
+def select_list(fields):
+    '''Build the column list of a select statement from validated fields.
+
+    Args:
+        fields: Columns returned by field_args, or None.
+
+    Returns:
+        string: The return value. Quoted column names, * when fields is None.
+    '''
+    if not fields:
+        return '*'
+    return ', '.join(f'`{x}`' for x in fields)
@@ -0,0 +1,53 @@
+import os
+
+from flask import request, jsonify
+
+from .responses import error
+
+
+def max_ids():
+    return int(os.environ.get('MULTI_GET_MAX', 100))
+
+
+def id_args():
+    '''Read the comma separated ids query parameter of the current request.
+
+    Returns:
+        tuple: The return value. Distinct integer IDs, None when ids is not given.
+    '''
+    ids = request.args.get('ids')
+    if ids is None:
+        return None
+    try:
+        ids = tuple(dict.fromkeys(int(x) for x in ids.split(',') if x.strip()))
+    except ValueError:
+        raise ValueError('ids must be a comma separated list of integers.')
+    if not ids or len(ids) > max_ids():
+        raise ValueError(f'ids must hold between 1 and {max_ids()} IDs.')
+    return ids
+
+
+def placeholders(ids):
+    '''Build the placeholder list of a WHERE id IN (...) clause.
+
+    Args:
+        ids: IDs to bind.
+
+    Returns:
+        string: The return value. One %s per ID.
+    '''
+    return ', '.join(['%s'] * len(ids))
+
+
+def keyed(rows):
+    '''Build a multi-get response keyed by row ID.
+
+    Args:
+        rows: Rows from the DAO, or an error string.
+
+    Returns:
+        Response: The return value. Rows keyed by their ID. Missing IDs are left out.
+    '''
+    if isinstance(rows, str):
+        return error(rows)
+    return jsonify({str(x['id']): x for x in rows})
@@ -0,0 +1,85 @@
+import base64
+import json
+import os
+
+from flask import request, jsonify
+
+from .responses import error
+
+
+def max_limit():
+    return int(os.environ.get('PAGE_MAX_LIMIT', 1000))
+
+
+def encode_cursor(row_id):
+    '''Create an opaque cursor pointing after the given row.
+
+    Args:
+        row_id: ID of the last row on the current page.
+
+    Returns:
+        string: The return value. URL safe cursor.
+    '''
+    raw = json.dumps({'id': row_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''Read the row ID back out of a cursor created by encode_cursor.
+
+    Args:
+        cursor: Opaque cursor.
+
+    Returns:
+        int: The return value. ID of the last row already returned.
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return int(json.loads(raw)['id'])
+    except Exception:
+        raise ValueError('invalid cursor.')
+
+
+def page_args():
+    '''Read the limit and after query parameters of the current request.
+
+    Returns:
+        tuple: The return value. Page size and last seen row ID, (None, None) when not paginating.
+    '''
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    if limit is None and after is None:
+        return None, None
+    try:
+        limit = int(limit) if limit is not None else max_limit()
+    except ValueError:
+        raise ValueError('limit must be an integer.')
+    if limit < 1 or limit > max_limit():
+        raise ValueError(f'limit must be between 1 and {max_limit()}.')
+    return limit, decode_cursor(after) if after else 0
+
+
+def page(rows, limit, columnar=False):
+    '''Build a page response from rows fetched with a limit of one more than the page size.
+
+    Args:
+        rows: Rows ordered by ID, or an error string from the DAO.
+        limit: Page size.
+        columnar: The first row holds the column names and the rest are row tuples.
+
+    Returns:
+        Response: The return value. Items and the cursor of the next page, null on the last page.
+    '''
+    if isinstance(rows, str):
+        return error(rows)
+    if columnar:
+        columns, rows = list(rows[0]), rows[1:]
+        items = rows[:limit]
+        last = items[-1][columns.index('id')] if items else None
+        body = {'columns': columns, 'rows': items}
+    else:
+        items = rows[:limit]
+        last = items[-1]['id'] if items else None
+        body = {'items': items}
+    body['next'] = encode_cursor(last) if len(rows) > limit else None
+    return jsonify(body)
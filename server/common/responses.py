@@ -1,4 +1,4 @@
-from flask import jsonify
+from flask import Response, current_app, jsonify, request, stream_with_context
 
 
 def json_status(status, msg, code):
@@ -15,3 +15,84 @@ def error(msg):
 
 def auth_error(msg):
     return json_status('message', msg, 401)
+
+
+def forbidden(msg):
+    return json_status('message', msg, 403)
+
+
+def unavailable(msg):
+    return json_status('message', msg, 503)
+
+
+COLUMNAR_MIMETYPE = 'application/vnd.unbreakable.columnar+json'
+
+
+def wants_columnar():
+    '''Check whether the client asked for the compact column-oriented list format.
+
+    Returns:
+        boolean: The return value. True for ?format=columnar or an Accept of the columnar type.
+    '''
+    if request.args.get('format') == 'columnar':
+        return True
+    return request.accept_mimetypes.best == COLUMNAR_MIMETYPE
+
+
+def json_stream(rows, columnar=False):
+    '''Stream an iterable of rows as a chunked JSON array.
+
+    The first row is pulled before the response is returned so query errors
+    are reported with a 400 instead of a truncated body. Rows are written in
+    chunks of about 64 KB.
+
+    Args:
+        rows: Iterable of JSON serializable rows, or an error string from the DAO.
+        columnar: The first item holds the column names and the rest are row tuples.
+            Written as {"columns": [...], "rows": [[...], ...]}.
+
+    Returns:
+        Response: The return value. Streamed application/json response.
+    '''
+    if isinstance(rows, str):
+        return error(rows)
+    rows = iter(rows)
+    try:
+        first = next(rows, None)
+    except Exception as e:
+        return error(str(e))
+
+    def pieces():
+        dumps = current_app.json.dumps
+        if columnar:
+            yield '{"columns":' + dumps(list(first or ())) + ',"rows":['
+            row = next(rows, None)
+            if row is not None:
+                yield dumps(row)
+                for row in rows:
+                    yield ',' + dumps(row)
+            yield ']}\n'
+            return
+        if first is None:
+            yield '[]\n'
+            return
+        yield '[' + dumps(first)
+        for row in rows:
+            yield ',' + dumps(row)
+        yield ']\n'
+
+    def generate():
+        chunk, size = [], 0
+        try:
+            for piece in pieces():
+                chunk.append(piece)
+                size += len(piece)
+                if size >= 65536:
+                    yield ''.join(chunk)
+                    chunk, size = [], 0
+            yield ''.join(chunk)
+        finally:
+            if hasattr(rows, 'close'):
+                rows.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -0,0 +1,83 @@
+import os
+import threading
+
+from flask import current_app, g, make_response, request
+from functools import wraps
+from werkzeug.datastructures import Headers
+
+from .db_connect import in_transaction
+
+_lock = threading.Lock()
+_flights = {}
+_counts = {'leaders': 0, 'followers': 0, 'timeouts': 0}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def _key():
+    args = tuple(sorted(request.args.items(multi=True)))
+    return (request.path, args, request.headers.get('Accept', ''), g.get('_etag'))
+
+
+def single_flight(f):
+    '''Decorator letting concurrent identical GET requests share one run of the view.
+
+    The first request for a path, query, Accept header and ETag runs the view and reads
+    its body into bytes. Requests arriving while it runs wait up to SINGLE_FLIGHT_TIMEOUT
+    seconds and are answered with a copy of the same status, headers and bytes. Keying on
+    the ETag set by conditional means a follower never gets a body older than its tag
+    versions. Only for views whose output depends on nothing else in the request, i.e.
+    unauthenticated reads. Streamed responses are not buffered, their followers run the
+    view on their own. Compression is negotiated afterwards for each response on its own.
+    Requests inside a transaction, e.g. in an atomic batch, always run the view on their own.
+    Coalescing needs concurrent requests in one process, i.e. threaded workers.
+    '''
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method != 'GET' or in_transaction():
+            return f(*args, **kwargs)
+        key = _key()
+        with _lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight()
+            _counts['leaders' if leader else 'followers'] += 1
+
+        if not leader:
+            if not flight.done.wait(float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 30))):
+                with _lock:
+                    _counts['timeouts'] += 1
+                return f(*args, **kwargs)
+            if flight.result is None:
+                return f(*args, **kwargs)
+            data, status, headers = flight.result
+            return current_app.response_class(data, status=status, headers=Headers(headers))
+
+        try:
+            res = make_response(f(*args, **kwargs))
+            if res.is_streamed:
+                return res
+            data = res.get_data()
+            headers = [(k, v) for k, v in res.headers.items() if k != 'Content-Length']
+            flight.result = (data, res.status_code, headers)
+            return current_app.response_class(data, status=res.status_code, headers=Headers(headers))
+        finally:
+            with _lock:
+                _flights.pop(key, None)
+            flight.done.set()
+    return decorated
+
+
+def single_flight_stats():
+    '''Retrieve the request coalescing counters for the current worker.
+
+    Returns:
+        dict: The return value. Leader and follower requests, follower timeouts and flights in progress.
+    '''
+    with _lock:
+        return dict(_counts, in_flight=len(_flights))
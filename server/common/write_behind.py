@@ -0,0 +1,94 @@
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    '''Buffer of pending writes coalesced by key and flushed from a background thread.
+
+    Only the latest value per key is kept. The buffer is flushed every `interval`
+    seconds, as soon as it holds `size` keys, and once more at interpreter exit.
+
+    Args:
+        flush: Function writing a dict of key to value. Returns an error string on failure,
+            in which case the entries are put back unless a newer value arrived meanwhile.
+        interval: Seconds between flushes.
+        size: Number of buffered keys that triggers an early flush.
+    '''
+
+    def __init__(self, flush, interval=5, size=500):
+        self._flush = flush
+        self.interval = interval
+        self.size = size
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._thread = None
+        self._pid = None
+        self._flushes = 0
+        self._written = 0
+        self._failures = 0
+
+    def put(self, key, value):
+        '''Buffer a value, replacing any pending value of the same key.
+
+        Args:
+            key: Row key, e.g. the user ID.
+            value: Value to write.
+        '''
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pending, self._pid = {}, os.getpid()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                atexit.register(self.drain)
+            self._pending[key] = value
+            full = len(self._pending) >= self.size
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.drain()
+
+    def drain(self):
+        '''Write every buffered value now.'''
+        with self._flushing:
+            with self._lock:
+                items, self._pending = self._pending, {}
+            if not items:
+                return
+            try:
+                res = self._flush(items)
+            except Exception as e:
+                res = str(e)
+            with self._lock:
+                self._flushes += 1
+                if isinstance(res, str):
+                    self._failures += 1
+                    for key, value in items.items():
+                        self._pending.setdefault(key, value)
+                else:
+                    self._written += len(items)
+        if isinstance(res, str):
+            logger.warning('write-behind flush of %d rows failed: %s', len(items), res)
+
+    def stats(self):
+        '''Snapshot of the buffer counters.
+
+        Returns:
+            dict: The return value. Pending keys, flushes, rows written and failed flushes.
+        '''
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'flushes': self._flushes,
+                'written': self._written,
+                'failures': self._failures
+            }
@@ -1,7 +1,13 @@
 from flask import g
 from datetime import datetime
 
-from ..common.db_connect import sql_command, sql_select
+from ..common.cache import invalidate
+from ..common.db_connect import sql_command, sql_command_many, sql_lookup, sql_select, sql_select_iter, sql_transaction
+from ..common.fieldsets import select_list
+from ..common.multiget import placeholders
+
+CUSTOMER_FIELDS = ('id', 'first', 'last', 'full', 'email', 'address',
+                   'city', 'state', 'zip', 'phone')
 
 
 def add_customer(customer):
@@ -16,31 +22,81 @@ def add_customer(customer):
     query = ('INSERT INTO customers (first, last, email, address, city, state, zip, phone, modified_by, modified_on) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);')
     data = (customer.first, customer.last, customer.email, customer.address,
             customer.city, customer.state, customer.zip, customer.phone, g.id, datetime.now())
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('customers')
+    return res
+
 
+def add_customers(customers):
+    '''Add a row to the customers table for each of the given customers in one multi-row insert.
+
+    Args:
+        customers: List of Customer class objects.
 
-def get_all_customers():
+    Returns:
+        int: The return value. Number of rows added if successful.
+    '''
+    query = ('INSERT INTO customers (first, last, email, address, city, state, zip, phone, modified_by, modified_on) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);')
+    now = datetime.now()
+    data = [(customer.first, customer.last, customer.email, customer.address, customer.city,
+             customer.state, customer.zip, customer.phone, g.id, now) for customer in customers]
+    try:
+        with sql_transaction():
+            res = sql_command_many(query, data)
+            invalidate('customers')
+        return res
+    except Exception as e:
+        return str(e)
+
+
+def get_all_customers(limit=None, after=0, columnar=False, fields=None):
     '''Retrieve all customers from the all_customers view.
 
+    Args:
+        limit: Maximum number of rows to return, ordered by ID. All rows when None.
+        after: Only return rows with an ID greater than this one.
+        columnar: Return the column names followed by row tuples instead of dicts.
+        fields: Columns to select, every column when None.
+
     Returns:
-        list: The return value. All rows from the select statement.
+        generator: The return value. All rows from the select statement, streamed. A list when limit is set.
     '''
-    query = 'SELECT * FROM all_customers;'
+    if limit is not None:
+        query = f'SELECT {select_list(fields)} FROM all_customers WHERE id > %s ORDER BY id LIMIT %s;'
+        data = (after, limit)
+        return sql_select(query, data, columnar=columnar)
+    query = f'SELECT {select_list(fields)} FROM all_customers;'
     data = ()
-    return sql_select(query, data)
+    return sql_select_iter(query, data, columnar=columnar)
 
 
-def get_customer(customer_id):
+def get_customer(customer_id, fields=None):
     '''Retrieve the customer from the all_customers view matching the target ID.
 
     Args:
         customer_id: Target customer ID.
+        fields: Columns to select, every column when None.
 
     Returns:
         list: The return value. The row from the select statement.
     '''
-    query = f'SELECT * FROM all_customers WHERE id = {customer_id};'
-    data = ()
+    query = f'SELECT {select_list(fields)} FROM all_customers WHERE id = %s;'
+    data = (customer_id,)
+    return sql_lookup(query, data)
+
+
+def get_customers(customer_ids, fields=None):
+    '''Retrieve the customers from the all_customers view matching any of the target IDs in one query.
+
+    Args:
+        customer_ids: Target IDs.
+        fields: Columns to select, every column when None.
+
+    Returns:
+        list: The return value. The rows from the select statement.
+    '''
+    query = f'SELECT {select_list(fields)} FROM all_customers WHERE id IN ({placeholders(customer_ids)});'
+    data = tuple(customer_ids)
     return sql_select(query, data)
 
 
@@ -56,7 +112,9 @@ def update_customer(customer):
     query = ('UPDATE customers SET first = %s, last = %s, email = %s, address = %s, city = %s, state = %s, zip = %s, phone = %s, modified_by = %s, modified_on = %s WHERE id = %s;')
     data = (customer.first, customer.last, customer.email, customer.address, customer.city,
             customer.state, customer.zip, customer.phone, g.id, datetime.now(), customer.id)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('customers', 'rentals')
+    return res
 
 
 def delete_customer(customer_id):
@@ -70,4 +128,29 @@ def delete_customer(customer_id):
     '''
     query = ('DELETE FROM customers WHERE id = %s;')
     data = (customer_id,)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('customers', 'rentals')
+    return res
+
+
+def export_customers(after_id=0, modified_since=None, limit=None):
+    '''Stream all customers from the all_customers view ordered by ID for export.
+
+    Args:
+        after_id: Only return rows with an ID greater than this one.
+        modified_since: Only return customers changed at or after this datetime.
+        limit: Maximum number of rows to return. All rows when None.
+
+    Returns:
+        generator: The return value. Column names followed by row tuples, streamed.
+    '''
+    query = 'SELECT * FROM all_customers WHERE id > %s'
+    data = [after_id]
+    if modified_since is not None:
+        query += ' AND id IN (SELECT id FROM customers WHERE modified_on >= %s)'
+        data.append(modified_since)
+    query += ' ORDER BY id'
+    if limit is not None:
+        query += ' LIMIT %s'
+        data.append(limit)
+    return sql_select_iter(query + ';', tuple(data), columnar=True)
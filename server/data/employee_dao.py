@@ -1,37 +1,74 @@
 from flask import g
 from datetime import datetime
 
-from ..common.db_connect import sql_command, sql_select
+from ..common.cache import cached, invalidate, unpaged_variant
+from ..auth.revocation import revoke_user
+from ..common.db_connect import sql_command, sql_lookup, sql_select, sql_select_iter, sql_transaction
+from ..common.fieldsets import select_list
+from ..common.multiget import placeholders
+from .user_dao import lock_role
 
+EMPLOYEE_FIELDS = ('id', 'email', 'role', 'first', 'last', 'address',
+                   'city', 'state', 'zip', 'phone')
 
-def get_all_employees():
+
+@cached('employees', skip=unpaged_variant)
+def get_all_employees(limit=None, after=0, columnar=False, fields=None):
     '''Retrieve all employees from the all_employees view.
 
+    Args:
+        limit: Maximum number of rows to return, ordered by ID. All rows when None.
+        after: Only return rows with an ID greater than this one.
+        columnar: Return the column names followed by row tuples instead of dicts.
+        fields: Columns to select, every column when None.
+
     Returns:
         list: The return value. All rows from the select statement.
     '''
-    query = 'SELECT * FROM all_employees;'
+    if limit is not None:
+        query = f'SELECT {select_list(fields)} FROM all_employees WHERE id > %s ORDER BY id LIMIT %s;'
+        data = (after, limit)
+        return sql_select(query, data, columnar=columnar)
+    query = f'SELECT {select_list(fields)} FROM all_employees;'
     data = ()
-    return sql_select(query, data)
+    return sql_select(query, data, columnar=columnar)
 
 
-def get_employee(employee_id):
+def get_employee(employee_id, fields=None):
     '''Retrieve the employee from the all_employees view matching the target ID.
 
     Args:
         employee_id: Target employee ID.
+        fields: Columns to select, every column when None.
 
     Returns:
         list: The return value. The row from the select statement.
     '''
-    query = f'SELECT * FROM all_employees WHERE id = {employee_id};'
-    data = ()
+    query = f'SELECT {select_list(fields)} FROM all_employees WHERE id = %s;'
+    data = (employee_id,)
+    return sql_lookup(query, data)
+
+
+def get_employees(employee_ids, fields=None):
+    '''Retrieve the employees from the all_employees view matching any of the target IDs in one query.
+
+    Args:
+        employee_ids: Target IDs.
+        fields: Columns to select, every column when None.
+
+    Returns:
+        list: The return value. The rows from the select statement.
+    '''
+    query = f'SELECT {select_list(fields)} FROM all_employees WHERE id IN ({placeholders(employee_ids)});'
+    data = tuple(employee_ids)
     return sql_select(query, data)
 
 
 def update_employee(employee):
     '''Update the data fields for the row of the employees table that matches the employee ID.
 
+    Tokens issued to the employee are revoked in the same transaction when the role changes.
+
     Args:
         employee: Employee class object.
 
@@ -41,11 +78,20 @@ def update_employee(employee):
     query = ('UPDATE users SET email = %s, role = %s, first = %s, last = %s, address = %s, city = %s, state = %s, zip = %s, phone = %s, modified_by = %s, modified_on = %s WHERE id = %s;')
     data = (employee.email, employee.role, employee.first, employee.last, employee.address,
             employee.city, employee.state, employee.zip, employee.phone, g.id, datetime.now(), employee.id)
-    return sql_command(query, data)
+    try:
+        with sql_transaction():
+            previous = lock_role(employee.id)
+            res = sql_command(query, data)
+            if previous is not None and previous != employee.role:
+                revoke_user(employee.id)
+    except Exception as e:
+        return str(e)
+    invalidate('employees')
+    return res
 
 
 def delete_employee(employee_id):
-    '''Delete the row from the users table that matches the target ID.
+    '''Delete the row from the users table that matches the target ID and revoke its tokens.
 
     Args:
         employee_id: Target employee ID.
@@ -55,4 +101,34 @@ def delete_employee(employee_id):
     '''
     query = ('DELETE FROM users WHERE id = %s;')
     data = (employee_id,)
-    return sql_command(query, data)
+    try:
+        with sql_transaction():
+            res = sql_command(query, data)
+            revoke_user(employee_id)
+    except Exception as e:
+        return str(e)
+    invalidate('employees')
+    return res
+
+
+def export_employees(after_id=0, modified_since=None, limit=None):
+    '''Stream all employees from the all_employees view ordered by ID for export.
+
+    Args:
+        after_id: Only return rows with an ID greater than this one.
+        modified_since: Only return employees changed at or after this datetime.
+        limit: Maximum number of rows to return. All rows when None.
+
+    Returns:
+        generator: The return value. Column names followed by row tuples, streamed.
+    '''
+    query = 'SELECT * FROM all_employees WHERE id > %s'
+    data = [after_id]
+    if modified_since is not None:
+        query += ' AND id IN (SELECT id FROM users WHERE modified_on >= %s)'
+        data.append(modified_since)
+    query += ' ORDER BY id'
+    if limit is not None:
+        query += ' LIMIT %s'
+        data.append(limit)
+    return sql_select_iter(query + ';', tuple(data), columnar=True)
@@ -1,7 +1,12 @@
 from flask import g
 from datetime import datetime
 
-from ..common.db_connect import sql_command, sql_select
+from ..common.cache import cached, invalidate, unpaged_variant
+from ..common.db_connect import primary_reads, sql_command, sql_command_many, sql_lookup, sql_select, sql_select_iter, sql_transaction
+from ..common.fieldsets import select_list
+from ..common.multiget import placeholders
+
+INVENTORY_FIELDS = ('id', 'title', 'movie_id', 'upc', 'charge', 'modified_on')
 
 
 def add_inventory_item(inventory):
@@ -16,31 +21,82 @@ def add_inventory_item(inventory):
     query = (
         'INSERT INTO inventory (movie_id, upc, modified_by, modified_on) VALUES (%s, %s, %s, %s);')
     data = (inventory.movie_id, inventory.upc, g.id, datetime.now())
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('inventory', 'movies', f'movie:{inventory.movie_id}')
+    return res
+
 
+def add_inventory_items(items):
+    '''Add a row to the inventory table for each of the given items in one multi-row insert.
 
-def get_available_inventory():
+    Args:
+        items: List of Inventory class objects.
+
+    Returns:
+        int: The return value. Number of rows added if successful.
+    '''
+    query = (
+        'INSERT INTO inventory (movie_id, upc, modified_by, modified_on) VALUES (%s, %s, %s, %s);')
+    now = datetime.now()
+    data = [(item.movie_id, item.upc, g.id, now) for item in items]
+    try:
+        with sql_transaction():
+            res = sql_command_many(query, data)
+            invalidate('inventory', 'movies', *sorted({f'movie:{x.movie_id}' for x in items}))
+        return res
+    except Exception as e:
+        return str(e)
+
+
+@cached('inventory', skip=unpaged_variant)
+def get_available_inventory(limit=None, after=0, columnar=False, fields=None):
     '''Retrieve all available inventory from the available_inventory view.
 
+    Args:
+        limit: Maximum number of rows to return, ordered by ID. All rows when None.
+        after: Only return rows with an ID greater than this one.
+        columnar: Return the column names followed by row tuples instead of dicts.
+        fields: Columns to select, every column when None.
+
     Returns:
         list: The return value. All rows from the select statement.
     '''
-    query = 'SELECT * FROM available_inventory;'
+    if limit is not None:
+        query = f'SELECT {select_list(fields)} FROM available_inventory WHERE id > %s ORDER BY id LIMIT %s;'
+        data = (after, limit)
+        return sql_select(query, data, columnar=columnar)
+    query = f'SELECT {select_list(fields)} FROM available_inventory;'
     data = ()
-    return sql_select(query, data)
+    return sql_select(query, data, columnar=columnar)
 
 
-def get_inventory(inventory_id):
+def get_inventory(inventory_id, fields=None):
     '''Retrieve the inventory item from the all_inventory view matching the target ID.
 
     Args:
         inventory_id: Target inventory item ID.
+        fields: Columns to select, every column when None.
 
     Returns:
         list: The return value. The row from the select statement.
     '''
-    query = f'SELECT * FROM all_inventory WHERE id = {inventory_id};'
-    data = ()
+    query = f'SELECT {select_list(fields)} FROM all_inventory WHERE id = %s;'
+    data = (inventory_id,)
+    return sql_lookup(query, data)
+
+
+def get_inventory_items(inventory_ids, fields=None):
+    '''Retrieve the inventory items from the all_inventory view matching any of the target IDs in one query.
+
+    Args:
+        inventory_ids: Target IDs.
+        fields: Columns to select, every column when None.
+
+    Returns:
+        list: The return value. The rows from the select statement.
+    '''
+    query = f'SELECT {select_list(fields)} FROM all_inventory WHERE id IN ({placeholders(inventory_ids)});'
+    data = tuple(inventory_ids)
     return sql_select(query, data)
 
 
@@ -53,6 +109,50 @@ def delete_inventory(inventory_id):
     Returns:
         int: The return value. 0 if successful.
     '''
+    movie_tags = get_movie_tags([inventory_id])
     query = ('DELETE FROM inventory WHERE id = %s;')
     data = (inventory_id,)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('inventory', 'movies', *movie_tags, 'rentals')
+    return res
+
+
+def get_movie_tags(inventory_ids):
+    '''Retrieve the cache tags of the movies the target inventory items belong to, from the primary.
+
+    Args:
+        inventory_ids: Target inventory item IDs.
+
+    Returns:
+        list: The return value. A movie:<id> tag per movie, the movie tag of every movie if the lookup fails.
+    '''
+    query = f'SELECT DISTINCT movie_id FROM inventory WHERE id IN ({placeholders(inventory_ids)});'
+    data = tuple(inventory_ids)
+    with primary_reads():
+        rows = sql_select(query, data)
+    if isinstance(rows, str):
+        return ['movie']
+    return [f'movie:{x["movie_id"]}' for x in rows]
+
+
+def export_inventory(after_id=0, modified_since=None, limit=None):
+    '''Stream all inventory items from the all_inventory view ordered by ID for export.
+
+    Args:
+        after_id: Only return rows with an ID greater than this one.
+        modified_since: Only return items changed at or after this datetime.
+        limit: Maximum number of rows to return. All rows when None.
+
+    Returns:
+        generator: The return value. Column names followed by row tuples, streamed.
+    '''
+    query = 'SELECT * FROM all_inventory WHERE id > %s'
+    data = [after_id]
+    if modified_since is not None:
+        query += ' AND id IN (SELECT id FROM inventory WHERE modified_on >= %s)'
+        data.append(modified_since)
+    query += ' ORDER BY id'
+    if limit is not None:
+        query += ' LIMIT %s'
+        data.append(limit)
+    return sql_select_iter(query + ';', tuple(data), columnar=True)
@@ -1,4 +1,10 @@
-from ..common.db_connect import sql_command, sql_select
+from ..common.cache import cached, invalidate, unpaged_variant
+from ..common.db_connect import sql_command, sql_command_many, sql_lookup, sql_select, sql_select_iter, sql_transaction
+from ..common.fieldsets import select_list
+from ..common.multiget import placeholders
+
+MOVIE_FIELDS = ('id', 'title', 'stock', 'rating', 'category', 'genres', 'year',
+                'minutes', 'language', 'actors', 'director', 'imdb')
 
 
 def add_movie(movie):
@@ -13,31 +19,82 @@ def add_movie(movie):
     query = ('INSERT INTO movies (category_id, title, genres, year, minutes, language, actors, director, imdb) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);')
     data = (movie.category, movie.title, movie.genres, movie.year,
             movie.minutes, movie.language, movie.actors, movie.director, movie.imdb)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('movies')
+    return res
+
 
+def add_movies(movies):
+    '''Add a row to the movies table for each of the given movies in one multi-row insert.
+
+    Args:
+        movies: List of Movie class objects.
 
-def get_all_movies():
+    Returns:
+        int: The return value. Number of rows added if successful.
+    '''
+    query = ('INSERT INTO movies (category_id, title, genres, year, minutes, language, actors, director, imdb) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);')
+    data = [(movie.category, movie.title, movie.genres, movie.year, movie.minutes,
+             movie.language, movie.actors, movie.director, movie.imdb) for movie in movies]
+    try:
+        with sql_transaction():
+            res = sql_command_many(query, data)
+            invalidate('movies')
+        return res
+    except Exception as e:
+        return str(e)
+
+
+@cached('movies', skip=unpaged_variant)
+def get_all_movies(limit=None, after=0, columnar=False, fields=None):
     '''Retrieve all movies from the all_movies view.
 
+    Args:
+        limit: Maximum number of rows to return, ordered by ID. All rows when None.
+        after: Only return rows with an ID greater than this one.
+        columnar: Return the column names followed by row tuples instead of dicts.
+        fields: Columns to select, every column when None.
+
     Returns:
-        list: The return value. All rows from the select statement.
+        generator: The return value. All rows from the select statement, streamed. A list when limit is set.
     '''
-    query = 'SELECT * FROM all_movies;'
+    if limit is not None:
+        query = f'SELECT {select_list(fields)} FROM all_movies WHERE id > %s ORDER BY id LIMIT %s;'
+        data = (after, limit)
+        return sql_select(query, data, columnar=columnar)
+    query = f'SELECT {select_list(fields)} FROM all_movies;'
     data = ()
-    return sql_select(query, data)
+    return sql_select_iter(query, data, columnar=columnar)
 
 
-def get_movie(movie_id):
+@cached('movie', 'movie:{0}')
+def get_movie(movie_id, fields=None):
     '''Retrieve the movie from the all_movies view matching the target ID.
 
     Args:
         movie_id: Target movie ID.
+        fields: Columns to select, every column when None.
 
     Returns:
         list: The return value. The row from the select statement.
     '''
-    query = f'SELECT * FROM all_movies WHERE id = {movie_id};'
-    data = ()
+    query = f'SELECT {select_list(fields)} FROM all_movies WHERE id = %s;'
+    data = (movie_id,)
+    return sql_lookup(query, data)
+
+
+def get_movies(movie_ids, fields=None):
+    '''Retrieve the movies from the all_movies view matching any of the target IDs in one query.
+
+    Args:
+        movie_ids: Target IDs.
+        fields: Columns to select, every column when None.
+
+    Returns:
+        list: The return value. The rows from the select statement.
+    '''
+    query = f'SELECT {select_list(fields)} FROM all_movies WHERE id IN ({placeholders(movie_ids)});'
+    data = tuple(movie_ids)
     return sql_select(query, data)
 
 
@@ -53,7 +110,9 @@ def update_movie(movie):
     query = ('UPDATE movies SET category_id = %s, title = %s, genres = %s, year = %s, minutes = %s, language = %s, actors = %s, director = %s, imdb = %s WHERE id = %s;')
     data = (movie.category, movie.title, movie.genres, movie.year,
             movie.minutes, movie.language, movie.actors, movie.director, movie.imdb, movie.id)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('movies', f'movie:{movie.id}', 'inventory', 'rentals')
+    return res
 
 
 def delete_movie(movie_id):
@@ -67,4 +126,28 @@ def delete_movie(movie_id):
     '''
     query = ('DELETE FROM movies WHERE id = %s;')
     data = (movie_id,)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('movies', f'movie:{movie_id}', 'inventory', 'rentals')
+    return res
+
+
+def export_movies(after_id=0, modified_since=None, limit=None):
+    '''Stream all movies from the all_movies view ordered by ID for export.
+
+    Args:
+        after_id: Only return rows with an ID greater than this one.
+        modified_since: Not supported, movies carry no modification time.
+        limit: Maximum number of rows to return. All rows when None.
+
+    Returns:
+        generator: The return value. Column names followed by row tuples, streamed.
+    '''
+    query = 'SELECT * FROM all_movies WHERE id > %s'
+    data = [after_id]
+    if modified_since is not None:
+        return 'modified_since is not supported for movies.'
+    query += ' ORDER BY id'
+    if limit is not None:
+        query += ' LIMIT %s'
+        data.append(limit)
+    return sql_select_iter(query + ';', tuple(data), columnar=True)
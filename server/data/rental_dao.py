@@ -1,12 +1,20 @@
 from flask import g
 from datetime import datetime, timedelta
 
-from ..common.db_connect import sql_command, sql_select
+from ..common.cache import invalidate
+from ..common.db_connect import primary_reads, sql_command, sql_command_many, sql_lookup, sql_select, sql_select_iter, sql_transaction
+from ..common.fieldsets import select_list
+from .inventory_dao import get_movie_tags
+
+RENTAL_FIELDS = ('id', 'customer_name', 'customer_id', 'titles', 'movie_ids',
+                 'rented_on', 'due_date')
 
 
 def add_rental(new_rental):
     '''Add a row to the rentals table using the given information and add a row to the inventory_rentals for each inventory item
 
+    All rows are written in one transaction, so a failure leaves no partial rental behind.
+
     Args:
         new_rental: PaymentInfo class object.
 
@@ -17,41 +25,54 @@ def add_rental(new_rental):
         'INSERT INTO rentals (customer_id, rented_by, rented_on, due_date) VALUES (%s, %s, %s, %s);')
     data = (new_rental.customer_id, g.id, datetime.now(),
             datetime.now() + timedelta(days=5))
-    rental_id = sql_command(query, data)
-
     inventory_ids = [x.strip() for x in new_rental.inventory_ids.split(',')]
-    for inventory_id in inventory_ids:
-        query = (
-            'INSERT INTO inventory_rentals (inventory_id, rental_id) VALUES (%s, %s);')
-        data = (inventory_id, rental_id)
-        sql_command(query, data)
-
-    return rental_id
-
-
-def get_all_current_rentals():
+    try:
+        with sql_transaction():
+            rental_id = sql_command(query, data)
+            query = (
+                'INSERT INTO inventory_rentals (inventory_id, rental_id) VALUES (%s, %s);')
+            data = [(inventory_id, rental_id) for inventory_id in inventory_ids]
+            sql_command_many(query, data)
+            invalidate('inventory', 'movies', *get_movie_tags(inventory_ids), 'rentals')
+        return rental_id
+    except Exception as e:
+        return str(e)
+
+
+def get_all_current_rentals(limit=None, after=0, columnar=False, fields=None):
     '''Retrieves current rentals from the all_rentals view.
 
+    Args:
+        limit: Maximum number of rows to return, ordered by ID. All rows when None.
+        after: Only return rows with an ID greater than this one.
+        columnar: Return the column names followed by row tuples instead of dicts.
+        fields: Columns to select, every column when None.
+
     Returns:
-        list: The return value. All rows from the select statement.
+        generator: The return value. All rows from the select statement, streamed. A list when limit is set.
     '''
-    query = 'SELECT * FROM all_rentals WHERE ISNULL(returned_on);'
+    if limit is not None:
+        query = f'SELECT {select_list(fields)} FROM all_rentals WHERE ISNULL(returned_on) AND id > %s ORDER BY id LIMIT %s;'
+        data = (after, limit)
+        return sql_select(query, data, columnar=columnar)
+    query = f'SELECT {select_list(fields)} FROM all_rentals WHERE ISNULL(returned_on);'
     data = ()
-    return sql_select(query, data)
+    return sql_select_iter(query, data, columnar=columnar)
 
 
-def get_current_rental(rental_id):
+def get_current_rental(rental_id, fields=None):
     '''Retrieve the current rental from the all_rentals view matching the target rental ID.
 
     Args:
         rental_id: Target rental ID.
+        fields: Columns to select, every column when None.
 
     Returns:
         list: The return value. The row from the select statement.
     '''
-    query = 'SELECT * FROM all_rentals WHERE ISNULL(returned_on) AND id = %s;'
+    query = f'SELECT {select_list(fields)} FROM all_rentals WHERE ISNULL(returned_on) AND id = %s;'
     data = (rental_id,)
-    return sql_select(query, data)
+    return sql_lookup(query, data)
 
 
 def return_rentals(rental_id):
@@ -65,4 +86,48 @@ def return_rentals(rental_id):
     '''
     query = ('UPDATE rentals SET returned_on = %s WHERE id = %s;')
     data = (datetime.now(), rental_id)
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('inventory', 'movies', *get_rental_movie_tags(rental_id), 'rentals')
+    return res
+
+
+def get_rental_movie_tags(rental_id):
+    '''Retrieve the cache tags of the movies rented in the target rental, from the primary.
+
+    Args:
+        rental_id: Target rental ID.
+
+    Returns:
+        list: The return value. A movie:<id> tag per movie, the movie tag of every movie if the lookup fails.
+    '''
+    query = ('SELECT DISTINCT i.movie_id FROM inventory_rentals r '
+             'JOIN inventory i ON i.id = r.inventory_id WHERE r.rental_id = %s;')
+    data = (rental_id,)
+    with primary_reads():
+        rows = sql_select(query, data)
+    if isinstance(rows, str):
+        return ['movie']
+    return [f'movie:{x["movie_id"]}' for x in rows]
+
+
+def export_rentals(after_id=0, modified_since=None, limit=None):
+    '''Stream the full rental history from the all_rentals view ordered by ID for export.
+
+    Args:
+        after_id: Only return rows with an ID greater than this one.
+        modified_since: Only return rentals rented or returned at or after this datetime.
+        limit: Maximum number of rows to return. All rows when None.
+
+    Returns:
+        generator: The return value. Column names followed by row tuples, streamed.
+    '''
+    query = 'SELECT * FROM all_rentals WHERE id > %s'
+    data = [after_id]
+    if modified_since is not None:
+        query += ' AND id IN (SELECT id FROM rentals WHERE rented_on >= %s OR returned_on >= %s)'
+        data.extend([modified_since, modified_since])
+    query += ' ORDER BY id'
+    if limit is not None:
+        query += ' LIMIT %s'
+        data.append(limit)
+    return sql_select_iter(query + ';', tuple(data), columnar=True)
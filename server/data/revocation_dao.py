@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from ..common.db_connect import primary_reads, sql_command, sql_lookup, sql_select_iter
+
+
+def add_revocation(key, revoked_on, expires):
+    '''Add or refresh a row in the revoked_tokens table.
+
+    Args:
+        key: jti:<token ID> for one token, or user:<user ID> for every token issued to the user until revoked_on.
+        revoked_on: Revocation time.
+        expires: Time after which every token the row covers has expired.
+
+    Returns:
+        int: The return value. 0 if successful.
+    '''
+    query = ('INSERT INTO revoked_tokens (token_key, revoked_on, expires) VALUES (%s, %s, %s) '
+             'ON DUPLICATE KEY UPDATE revoked_on = VALUES(revoked_on), expires = VALUES(expires);')
+    data = (key, revoked_on, expires)
+    return sql_command(query, data)
+
+
+def get_revocation(key):
+    '''Retrieve the revocation time of the given key.
+
+    Read from the primary so a revocation is confirmed as soon as it is committed.
+
+    Args:
+        key: Revocation key.
+
+    Returns:
+        list: The return value. The row from the select statement, if any.
+    '''
+    query = ('SELECT revoked_on FROM revoked_tokens WHERE token_key = %s;')
+    data = (key,)
+    with primary_reads():
+        return sql_lookup(query, data)
+
+
+def get_active_revocations():
+    '''Stream the keys of the revocations still covering unexpired tokens.
+
+    Returns:
+        generator: The return value. Columnar rows, column names first.
+    '''
+    query = ('SELECT token_key FROM revoked_tokens WHERE expires > %s;')
+    data = (datetime.now(),)
+    return sql_select_iter(query, data, columnar=True)
+
@@ -1,53 +1,120 @@
 import json
+import os
 
 from flask import g
 from datetime import datetime
 
-from ..common.db_connect import sql_command, sql_select
+from ..common.cache import invalidate
+from ..common.db_connect import after_commit, primary_reads, sql_command, sql_lookup, sql_select, sql_transaction
+from ..common.write_behind import WriteBehind
 from ..models.user_model import User
-from ..auth.hash import get_salt, hash_password, check_password
+from ..auth.hash import make_password, verify_password
+from ..auth.hash_pool import HashBusy
+from ..auth.revocation import revoke_user
 
 
 def check_user(email):
-    '''Retrieve the row from the users table that matches the email.
+    '''Retrieve the login row from the users table that matches the email.
+
+    Read from the primary, so a new signup or a rehashed password is seen right away.
 
     Args:
         email: Target email.
 
     Returns:
-        list: The return value. The row from the select statement.
+        list: The return value. The row from the select statement, with id, first, last, password and role.
     '''
-    query = ('SELECT id, first, last, password FROM users WHERE email = %s;')
+    query = ('SELECT id, first, last, password, role FROM users WHERE email = %s;')
     data = (email,)
-    return sql_select(query, data)
+    with primary_reads():
+        return sql_lookup(query, data)
 
 
 def auth_user(creds):
     '''Retrieve the given email from the users table and compare the passwords.
 
+    The user and role are read in one query. The stored hash is replaced when it was
+    made with outdated hashing parameters.
+
     Args:
         creds: Creds class object.
 
     Returns:
-        int: The return value. User class object if successful.
+        tuple: The return value. User class object as a dict and the user role if successful, -1 otherwise.
     '''
     res = check_user(creds.email)
     if len(res) == 1:
         res = res[0]
-        data = json.loads(res['password'])
-        salt = data['salt']
-        hashed = data['hash']
-        if check_password(creds.password, hashed, salt):
-            query = ('UPDATE users SET last_login = %s WHERE id = %s;')
-            data = (datetime.now(), res['id'])
-            sql_command(query, data)
-            return User(res['id'], res['first'], res['last']).as_dict()
+        matches, outdated = verify_password(creds.password, json.loads(res['password']))
+        if matches:
+            if outdated:
+                set_password(res['id'], make_password(creds.password))
+            set_last_login(res['id'])
+            return User(res['id'], res['first'], res['last']).as_dict(), res['role']
     return -1
 
 
+def set_password(user_id, password):
+    '''Replace the stored password hash for the user that matches the target ID.
+
+    Args:
+        user_id: Target user ID.
+        password: Dict from make_password().
+
+    Returns:
+        int: The return value. 0 if successful.
+    '''
+    query = ('UPDATE users SET password = %s WHERE id = %s;')
+    data = (json.dumps(password), user_id)
+    return sql_command(query, data)
+
+
+def _write_last_logins(logins):
+    ids = list(logins)
+    query = ('UPDATE users SET last_login = CASE id ' + 'WHEN %s THEN %s ' * len(ids) +
+             'END WHERE id IN (' + ', '.join(['%s'] * len(ids)) + ');')
+    data = tuple(x for user_id in ids for x in (user_id, logins[user_id])) + tuple(ids)
+    return sql_command(query, data)
+
+
+_last_logins = WriteBehind(
+    _write_last_logins,
+    interval=float(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 5)),
+    size=int(os.environ.get('LAST_LOGIN_FLUSH_SIZE', 500))
+)
+
+
+def set_last_login(user_id):
+    '''Set the last login time for the user that matches the target ID to now.
+
+    The update is buffered and written in a batch with other logins within
+    LAST_LOGIN_FLUSH_INTERVAL seconds. Inside a transaction it is buffered on commit.
+
+    Args:
+        user_id: Target user ID.
+
+    Returns:
+        int: The return value. 0 if successful.
+    '''
+    login = datetime.now()
+    after_commit(lambda: _last_logins.put(user_id, login))
+    return 0
+
+
+def last_login_stats():
+    '''Retrieve the counters of the buffered last_login writes for the current worker.
+
+    Returns:
+        dict: The return value. Pending users, flushes, rows written and failed flushes.
+    '''
+    return _last_logins.stats()
+
+
 def set_role(user_id, user_role):
     '''Set the role for the user that matches the target ID.
 
+    Tokens issued to the user are revoked in the same transaction when a role they carry changes.
+
     Args:
         user_id: Target user ID.
 
@@ -56,21 +123,31 @@ def set_role(user_id, user_role):
     '''
     query = ('UPDATE users SET role = %s WHERE id = %s;')
     data = (user_role, user_id)
-    return sql_command(query, data)
+    try:
+        with sql_transaction():
+            previous = lock_role(user_id)
+            res = sql_command(query, data)
+            if previous is not None and previous != user_role:
+                revoke_user(user_id)
+    except Exception as e:
+        return str(e)
+    invalidate('employees')
+    return res
 
 
-def get_role(user_id):
-    '''Retrieve the role for the user that matches the target ID.
+def lock_role(user_id):
+    '''Lock the row of the user that matches the target ID and retrieve its role, inside sql_transaction().
 
     Args:
         user_id: Target user ID.
 
     Returns:
-        string: The return value. User role if successful.
+        string: The return value. Current role, None if the user has none or does not exist.
     '''
-    query = ('SELECT role FROM users WHERE id = %s;')
+    query = ('SELECT role FROM users WHERE id = %s FOR UPDATE;')
     data = (user_id,)
-    return sql_select(query, data)[0]
+    rows = sql_select(query, data)
+    return rows[0]['role'] if rows else None
 
 
 def add_user(creds):
@@ -84,8 +161,30 @@ def add_user(creds):
     '''
     query = (
         'INSERT INTO users (email, password, modified_by, modified_on) VALUES (%s, %s, %s, %s);')
-    salt = get_salt()
-    hashed = hash_password(creds.password, salt)
-    password = json.dumps({'salt': salt, 'hash': hashed})
+    password = json.dumps(make_password(creds.password))
     data = (creds.email, password, '0', datetime.now())
-    return sql_command(query, data)
+    res = sql_command(query, data)
+    invalidate('employees')
+    return res
+
+
+def create_user(creds, user_role):
+    '''Add a user with the given role and record the login in a single transaction.
+
+    Args:
+        creds: Creds class object.
+        user_role: Role to assign to the new user.
+
+    Returns:
+        int: The return value. User ID if successful.
+    '''
+    try:
+        with sql_transaction():
+            user_id = add_user(creds)
+            set_role(user_id, user_role)
+            set_last_login(user_id)
+        return user_id
+    except HashBusy:
+        raise
+    except Exception as e:
+        return str(e)
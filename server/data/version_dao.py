@@ -0,0 +1,31 @@
+from ..common.db_connect import sql_command_many, sql_lookup
+from ..common.multiget import placeholders
+
+
+def get_versions(tags):
+    '''Retrieve the shared versions of the given cache tags.
+
+    Args:
+        tags: Cache tags.
+
+    Returns:
+        list: The return value. Rows with tag and version. Tags never bumped have no row.
+    '''
+    query = ('SELECT tag, version FROM cache_versions WHERE tag IN (' + placeholders(tags) + ');')
+    data = tuple(tags)
+    return sql_lookup(query, data)
+
+
+def bump_versions(tags):
+    '''Increment the shared versions of the given cache tags, adding rows for new tags.
+
+    Args:
+        tags: Cache tags, sorted so concurrent writers lock the rows in the same order.
+
+    Returns:
+        int: The return value. Number of rows affected.
+    '''
+    query = ('INSERT INTO cache_versions (tag, version) VALUES (%s, 1) '
+             'ON DUPLICATE KEY UPDATE version = version + 1;')
+    data = [(x,) for x in tags]
+    return sql_command_many(query, data)